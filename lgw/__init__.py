@@ -17,7 +17,14 @@ def parse_args():
     subparsers = parser.add_subparsers(dest="command", required=True)
 
     # gw-deploy
-    subparsers.add_parser("gw-deploy", parents=[parent_parser], help="Deploy the API Gateway")
+    gw_deploy_parser = subparsers.add_parser(
+        "gw-deploy", parents=[parent_parser], help="Deploy the API Gateway"
+    )
+    gw_deploy_parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Show the changes the deployment would make, without making them.",
+    )
 
     # gw-undeploy
     subparsers.add_parser("gw-undeploy", parents=[parent_parser], help="Undeploy the API Gateway")
@@ -35,6 +42,9 @@ def parse_args():
     lambda_deploy_parser.add_argument(
         "--lambda-file", help="Path to zip file with executable lambda code."
     )
+    lambda_deploy_parser.add_argument(
+        "--layer-file", help="Path to zip file of a layer with the lambda's dependencies."
+    )
 
     # lambda-invoke
     lambda_invoke_parser = subparsers.add_parser(
@@ -46,6 +56,34 @@ def parse_args():
     lambda_invoke_parser.add_argument(
         "--payload", help="Path to a JSON file with data to send with the lambda invocation."
     )
+    lambda_invoke_parser.add_argument(
+        "--batch",
+        help="Path to a JSONL file, or a directory of JSON files, of payloads to invoke with.",
+    )
+    lambda_invoke_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=10,
+        help="Maximum number of batch invocations in flight at once.",
+    )
+    lambda_invoke_parser.add_argument(
+        "--repeat", type=int, default=1, help="Number of times to send each batch payload."
+    )
+    lambda_invoke_parser.add_argument(
+        "--output",
+        help="Path to write the response, or the JSON results of a batch invocation, to.",
+    )
+    lambda_invoke_parser.add_argument(
+        "--invocation-type",
+        choices=["RequestResponse", "Event", "DryRun"],
+        default="RequestResponse",
+        help="Wait for the response, or queue the invocation as an Event.",
+    )
+    lambda_invoke_parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream the response as it is produced, using response streaming.",
+    )
 
     # lambda-delete
     lambda_delete_parser = subparsers.add_parser(
@@ -56,7 +94,24 @@ def parse_args():
     )
 
     # lambda-archive
-    subparsers.add_parser("lambda-archive", parents=[parent_parser], help="Create a Lambda archive")
+    lambda_archive_parser = subparsers.add_parser(
+        "lambda-archive", parents=[parent_parser], help="Create a Lambda archive"
+    )
+    lambda_archive_parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep updating the archive as the project files change.",
+    )
+    lambda_archive_parser.add_argument(
+        "--deploy",
+        action="store_true",
+        help="Deploy the lambda with the archive whenever it is built or updated.",
+    )
+    lambda_archive_parser.add_argument(
+        "--analyze",
+        action="store_true",
+        help="Report the largest packages and files in the archive.",
+    )
 
     args = parser.parse_args()
 
@@ -0,0 +1,74 @@
+'''
+Reports what takes up the space in a lambda archive.
+'''
+
+from zipfile import ZipFile
+
+from lgw.util import MAX_LAMBDA_SIZE, MAX_UNZIPPED_LAMBDA_SIZE
+
+# Sizes are reported in MiB, in which the unzipped limit is a round 250.
+MIB = 1024 * 1024
+DEFAULT_TOP = 15
+
+
+def analyze_archive(location):
+    '''
+    Sums the compressed and uncompressed sizes of the entries of the archive at `location`,
+    in total and per package, where a package is the first component of an entry's path.
+
+    :return: Dictionary of the totals, and of `packages` and `files` as lists of
+             `(name, compressed, uncompressed, files)` tuples, largest first.
+    '''
+    packages = {}
+    files = []
+    with ZipFile(location) as zf:
+        for zinfo in zf.infolist():
+            if zinfo.is_dir():
+                continue
+            files.append((zinfo.filename, zinfo.compress_size, zinfo.file_size, 1))
+            package = zinfo.filename.split('/', 1)[0]
+            compressed, uncompressed, count = packages.get(package, (0, 0, 0))
+            packages[package] = (
+                compressed + zinfo.compress_size,
+                uncompressed + zinfo.file_size,
+                count + 1,
+            )
+
+    def largest(rows):
+        return sorted(rows, key=lambda row: (-row[1], row[0]))
+
+    return {
+        'location': location,
+        'compressed': sum(f[1] for f in files),
+        'uncompressed': sum(f[2] for f in files),
+        'files': largest(files),
+        'packages': largest((name, *sizes) for name, sizes in packages.items()),
+    }
+
+
+def format_report(analysis, top=DEFAULT_TOP):
+    '''
+    Formats the result of `analyze_archive` as a text report of the `top` largest packages
+    and files, and of how close the archive is to the lambda size limits.
+    '''
+    compressed = analysis['compressed']
+    uncompressed = analysis['uncompressed']
+    lines = [
+        f'Archive: {analysis["location"]}',
+        '  compressed   %8.1f MiB, %5.1f%% of the %.1f MiB direct upload limit'
+        % (compressed / MIB, 100.0 * compressed / MAX_LAMBDA_SIZE, MAX_LAMBDA_SIZE / MIB),
+        '  uncompressed %8.1f MiB, %5.1f%% of the %.1f MiB unzipped limit'
+        % (
+            uncompressed / MIB,
+            100.0 * uncompressed / MAX_UNZIPPED_LAMBDA_SIZE,
+            MAX_UNZIPPED_LAMBDA_SIZE / MIB,
+        ),
+    ]
+    for title, rows in [('packages', analysis['packages']), ('files', analysis['files'])]:
+        lines += ['', '%-60s %11s %13s %6s' % (f'Largest {title}', 'zipped', 'unzipped', 'files')]
+        for name, compressed, uncompressed, count in rows[:top]:
+            lines.append(
+                '%-60s %7.2f MiB %9.2f MiB %6d'
+                % (name, compressed / MIB, uncompressed / MIB, count)
+            )
+    return '\n'.join(lines)
@@ -1,9 +1,35 @@
+import re
 import json
+import posixpath
+from collections import namedtuple
 from logging import info
-import boto3
+from lgw.clients import get_client
+from lgw.api_index import lookup_api_id, remember_api, forget_api
 from botocore.exceptions import ClientError
 from lgw.lambda_util import get_lambda_info, grant_permission_to_api_resource
 
+SUCCESS_STATUS = '200'
+RESOURCES_PAGE_SIZE = 500
+OPENAPI_VERSION = '3.0.1'
+ANY_METHOD = 'x-amazon-apigateway-any-method'
+PATH_PARAMETER = re.compile(r'\{(\w+)\+?\}')
+
+# Schemas of the models API Gateway creates in every REST API.
+BUILTIN_MODELS = {
+    'Empty': {'title': 'Empty Schema', 'type': 'object'},
+    'Error': {
+        'title': 'Error Schema',
+        'type': 'object',
+        'properties': {'message': {'type': 'string'}},
+    },
+}
+
+# One step of a plan: `action` is the API Gateway call that applies it, `path` and
+# `http_method` locate the resource and method it applies to, and `params` are the other
+# arguments of the call.
+Change = namedtuple('Change', 'action path http_method params')
+ApiPlan = namedtuple('ApiPlan', 'api_id resource_ids changes')
+
 
 def create_rest_api(
     api_name,
@@ -17,7 +43,8 @@ def create_rest_api(
 ):
     '''
     Creates & deploys a REST API that proxies to a Lambda function, returning the URL
-    pointing to this API.
+    pointing to this API.  Only the changes found by `plan_api_changes` are applied, and the
+    API is only redeployed when something changed or the stage does not exist yet.
 
     :param api_name: Name of the REST API
     :param api_description: Textual description of the API
@@ -31,91 +58,373 @@ def create_rest_api(
     :return: URL of API. If error, returns None.
     '''
 
-    api_client = boto3.client('apigateway')
-
-    api_id = create_api_gateway(api_client, api_name, api_description, binary_types)
+    api_client = get_client('apigateway')
 
     (lambda_arn, lambda_uri, region, account_id) = get_lambda_info(lambda_name)
 
-    root_resource_id = get_root_resource_id(api_client, api_id)
-    create_method(api_client, api_id, root_resource_id, 'ANY')
-    create_lambda_integration(api_client, api_id, root_resource_id, lambda_uri, integration_role)
-
-    child_resource_id = create_resource(api_client, api_id, root_resource_id, resource_path)
-    create_method(api_client, api_id, child_resource_id, 'ANY', method_response_models)
-    create_lambda_integration(api_client, api_id, child_resource_id, lambda_uri, integration_role)
-
-    deploy_to_stage(api_client, api_id, deploy_stage)
+    plan = plan_api_changes(
+        api_client,
+        api_name,
+        api_description,
+        binary_types,
+        lambda_uri,
+        resource_path,
+        deploy_stage,
+        integration_role,
+        method_response_models,
+    )
+    if not plan.changes:
+        info(f'API {api_name} is up to date.')
+    api_id = apply_plan(api_client, plan)
 
     # grant_permission_to_api_resource(api_id, region, account_id, lambda_arn, resource_path)
 
     return f'https://{api_id}.execute-api.{region}.amazonaws.com/{deploy_stage}'
 
 
-def delete_rest_api(api_name):
-    api_client = boto3.client('apigateway')
-    delete_api_gateway(api_client, api_name)
+def plan_rest_api(
+    api_name,
+    api_description,
+    binary_types,
+    lambda_name,
+    resource_path,
+    deploy_stage,
+    integration_role,
+    method_response_models,
+):
+    '''
+    Returns the `ApiPlan` of the changes `create_rest_api` would apply, without applying
+    them.  Takes the same parameters as `create_rest_api`.
+    '''
+    api_client = get_client('apigateway')
+    (lambda_arn, lambda_uri, region, account_id) = get_lambda_info(lambda_name)
+    return plan_api_changes(
+        api_client,
+        api_name,
+        api_description,
+        binary_types,
+        lambda_uri,
+        resource_path,
+        deploy_stage,
+        integration_role,
+        method_response_models,
+    )
 
 
-def deploy_to_stage(api_client, api_id, deploy_stage):
-    return api_client.create_deployment(restApiId=api_id, stageName=deploy_stage)
+def plan_api_changes(
+    api_client,
+    api_name,
+    api_description,
+    binary_types,
+    lambda_uri,
+    resource_path,
+    deploy_stage,
+    integration_role,
+    method_response_models,
+):
+    '''
+    Compares the REST API named `api_name` with the one `create_rest_api` deploys.  The
+    resources of the API are read with their methods and integrations embedded, so an
+    existing API costs one read per page of resources, and one more for its stage.
 
+    :return: `ApiPlan` of the ID of the API, or None if it does not exist yet, the IDs of
+             its resources by path, and the changes that bring it up to date, in the order
+             they are applied.
+    '''
+    api_id = lookup_api_gateway(api_client, api_name)
+    changes = []
+    if api_id:
+        resources = get_api_resources(api_client, api_id)
+    else:
+        params = {'name': api_name, 'description': api_description}
+        params['binaryMediaTypes'] = binary_types
+        changes.append(Change('create_rest_api', '/', None, params))
+        resources = {'/': {}}
+
+    desired = {
+        path: {'ANY': method_spec(lambda_uri, integration_role, models)}
+        for path, models in api_routes(resource_path, method_response_models).items()
+    }
+    changes += diff_resources(resources, desired)
+
+    if changes or not stage_exists(api_client, api_id, deploy_stage):
+        changes.append(Change('create_deployment', None, None, {'stageName': deploy_stage}))
+    resource_ids = {path: resource.get('id') for path, resource in resources.items()}
+    return ApiPlan(api_id, resource_ids, changes)
+
+
+def api_routes(resource_path, method_response_models):
+    '''
+    Returns the response models of the `ANY` method of each resource of the API, by path.
+    '''
+    return {'/': {}, posixpath.join('/', resource_path): method_response_models}
+
+
+def method_spec(lambda_uri, integration_role, method_response_models):
+    '''
+    Returns the desired state of a method that proxies to the lambda at `lambda_uri`.
+    '''
+    return {
+        'authorizationType': 'NONE',
+        'responseModels': method_response_models,
+        'integration': {
+            'type': 'AWS_PROXY',
+            'httpMethod': 'POST',
+            'uri': lambda_uri,
+            'credentials': integration_role or None,
+        },
+    }
+
+
+def diff_resources(resources, desired):
+    '''
+    Returns the changes that turn the `resources` of an API, by path, into the `desired`
+    method specs by path and HTTP method.  Resources and methods that are not desired are
+    left alone.
+    '''
+    changes = []
+    for path, methods in desired.items():
+        resource = resources.get(path)
+        if resource is None:
+            params = {'pathPart': posixpath.basename(path)}
+            changes.append(Change('create_resource', path, None, params))
+            resource = {}
+        existing = resource.get('resourceMethods', {})
+        for http_method, spec in methods.items():
+            changes += diff_method(path, http_method, existing.get(http_method), spec)
+    return changes
+
+
+def diff_method(path, http_method, method, spec):
+    changes = []
+    if method is None:
+        params = {'authorizationType': spec['authorizationType']}
+        changes.append(Change('put_method', path, http_method, params))
+        method = {}
+
+    models = spec['responseModels']
+    response = method.get('methodResponses', {}).get(SUCCESS_STATUS)
+    if response is not None and response.get('responseModels', {}) != models:
+        # Method responses cannot be put over an existing one.
+        params = {'statusCode': SUCCESS_STATUS}
+        changes.append(Change('delete_method_response', path, http_method, params))
+        response = None
+    if response is None:
+        params = {'statusCode': SUCCESS_STATUS, 'responseModels': models}
+        changes.append(Change('put_method_response', path, http_method, params))
+
+    integration = method.get('methodIntegration', {})
+    if any(integration.get(key) != value for key, value in spec['integration'].items()):
+        params = {
+            'type': spec['integration']['type'],
+            'integrationHttpMethod': spec['integration']['httpMethod'],
+            'uri': spec['integration']['uri'],
+        }
+        if spec['integration']['credentials']:
+            params['credentials'] = spec['integration']['credentials']
+        changes.append(Change('put_integration', path, http_method, params))
+    return changes
+
+
+def apply_plan(api_client, plan):
+    '''
+    Applies the changes of `plan` in order.
 
-def create_lambda_integration(api_client, api_id, root_resource_id, lambda_uri, role_arn=None):
+    :return: ID of the API, which is only known after applying a plan that creates it.
     '''
-    Set the Lambda function as the destination for the ANY method
-    Extract the Lambda region and AWS account ID from the Lambda ARN
-    ARN format="arn:aws:lambda:REGION:ACCOUNT_ID:function:FUNCTION_NAME"
+    api_id = plan.api_id
+    resource_ids = dict(plan.resource_ids)
+    for change in plan.changes:
+        info(format_change(change))
+        if change.action == 'create_rest_api':
+            api_id = api_client.create_rest_api(**change.params)['id']
+            remember_api(api_client, change.params['name'], api_id)
+            resource_ids['/'] = get_root_resource_id(api_client, api_id)
+        elif change.action == 'create_resource':
+            parent_id = resource_ids[posixpath.dirname(change.path)]
+            result = api_client.create_resource(
+                restApiId=api_id, parentId=parent_id, **change.params
+            )
+            resource_ids[change.path] = result['id']
+        elif change.action == 'create_deployment':
+            api_client.create_deployment(restApiId=api_id, **change.params)
+        else:
+            getattr(api_client, change.action)(
+                restApiId=api_id,
+                resourceId=resource_ids[change.path],
+                httpMethod=change.http_method,
+                **change.params,
+            )
+    return api_id
+
+
+def format_change(change):
+    target = ' '.join(part for part in (change.http_method, change.path) if part)
+    params = ', '.join(f'{key}={value}' for key, value in change.params.items())
+    return f'{change.action} {target} ({params})' if target else f'{change.action} ({params})'
+
+
+def format_plan(plan):
+    if not plan.changes:
+        return 'No changes.'
+    return '\n'.join(format_change(change) for change in plan.changes)
+
+
+def get_api_resources(api_client, api_id):
     '''
-    api_client.put_integration(
+    Returns the resources of the API by path, with their methods and integrations.
+    '''
+    paginator = api_client.get_paginator('get_resources')
+    pages = paginator.paginate(
         restApiId=api_id,
-        resourceId=root_resource_id,
-        httpMethod='ANY',
-        type='AWS_PROXY',
-        integrationHttpMethod='POST',
-        uri=lambda_uri,
-        credentials=role_arn,
+        embed=['methods'],
+        PaginationConfig={'PageSize': RESOURCES_PAGE_SIZE},
     )
+    return {resource['path']: resource for page in pages for resource in page['items']}
 
 
-def create_method(api_client, api_id, resource_id, http_method, method_response_models={}):
+def stage_exists(api_client, api_id, deploy_stage):
     try:
-        response = api_client.get_method(
-            restApiId=api_id, resourceId=resource_id, httpMethod=http_method
-        )
-        if response and response.get('httpMethod'):
-            info(f'{http_method} method already exists for resource {resource_id}')
-            return
+        api_client.get_stage(restApiId=api_id, stageName=deploy_stage)
     except api_client.exceptions.NotFoundException:
-        info(f'{http_method} method does not exist for resource {resource_id}, adding it.')
+        return False
+    return True
 
-    api_client.put_method(
-        resourceId=resource_id, restApiId=api_id, httpMethod=http_method, authorizationType='NONE'
-    )
 
-    # Set the content-type of the method response to JSON
-    api_client.put_method_response(
-        restApiId=api_id,
-        resourceId=resource_id,
-        httpMethod=http_method,
-        statusCode='200',
-        responseModels=method_response_models,
+def import_rest_api(
+    api_name,
+    api_description,
+    binary_types,
+    lambda_name,
+    resource_path,
+    deploy_stage,
+    integration_role,
+    method_response_models,
+):
+    '''
+    Creates & deploys the same REST API as `create_rest_api`, but renders it as an OpenAPI
+    document and imports it in a single call, overwriting an existing API of the same name.
+    Takes the same parameters as `create_rest_api`.
+
+    :return: URL of API.
+    '''
+    api_client = get_client('apigateway')
+
+    (lambda_arn, lambda_uri, region, account_id) = get_lambda_info(lambda_name)
+
+    document = openapi_document(
+        api_name,
+        api_description,
+        binary_types,
+        lambda_uri,
+        resource_path,
+        integration_role,
+        method_response_models,
     )
+    body = json.dumps(document).encode('utf8')
 
+    api_id = lookup_api_gateway(api_client, api_name)
+    if api_id:
+        info(f'Overwriting API {api_id} with its OpenAPI document')
+        api_client.put_rest_api(restApiId=api_id, mode='overwrite', body=body, failOnWarnings=True)
+    else:
+        info(f'Importing API {api_name} from its OpenAPI document')
+        api_id = api_client.import_rest_api(body=body, failOnWarnings=True)['id']
+        remember_api(api_client, api_name, api_id)
 
-def create_resource(api_client, api_id, parent_id, resource_path):
-    resources = api_client.get_resources(restApiId=api_id)
-    if 'items' in resources:
-        for resource in resources['items']:
-            if resource.get('parentId') == parent_id and resource.get('pathPart') == resource_path:
-                info('Found existing resource for %s' % resource['parentId'])
-                return resource['id']
+    deploy_to_stage(api_client, api_id, deploy_stage)
 
-    info(f'No existing resource found for {parent_id}/{resource_path}, creating a new one')
-    result = api_client.create_resource(
-        restApiId=api_id, parentId=parent_id, pathPart=resource_path
+    return f'https://{api_id}.execute-api.{region}.amazonaws.com/{deploy_stage}'
+
+
+def render_rest_api(
+    api_name,
+    api_description,
+    binary_types,
+    lambda_name,
+    resource_path,
+    integration_role,
+    method_response_models,
+):
+    '''
+    Returns the OpenAPI document `import_rest_api` would import, without importing it.
+    '''
+    (lambda_arn, lambda_uri, region, account_id) = get_lambda_info(lambda_name)
+    return openapi_document(
+        api_name,
+        api_description,
+        binary_types,
+        lambda_uri,
+        resource_path,
+        integration_role,
+        method_response_models,
     )
-    return result['id']
+
+
+def openapi_document(
+    api_name,
+    api_description,
+    binary_types,
+    lambda_uri,
+    resource_path,
+    integration_role,
+    method_response_models,
+):
+    '''
+    Renders the REST API that proxies to the lambda at `lambda_uri` as an OpenAPI 3
+    document with API Gateway's extensions.
+
+    :raises ValueError: if a response model is not one of the `BUILTIN_MODELS`, as the
+                        import replaces all the models of the API.
+    '''
+    integration = {
+        'type': 'aws_proxy',
+        'httpMethod': 'POST',
+        'uri': lambda_uri,
+        'passthroughBehavior': 'when_no_match',
+    }
+    if integration_role:
+        integration['credentials'] = integration_role
+
+    paths = {}
+    schemas = {}
+    for path, models in api_routes(resource_path, method_response_models).items():
+        response = {'description': f'{SUCCESS_STATUS} response'}
+        for content_type, model in models.items():
+            if model not in BUILTIN_MODELS:
+                raise ValueError(f'Response model {model} cannot be imported, use Empty or Error')
+            schemas[model] = BUILTIN_MODELS[model]
+            response.setdefault('content', {})[content_type] = {
+                'schema': {'$ref': f'#/components/schemas/{model}'}
+            }
+        method = {
+            'responses': {SUCCESS_STATUS: response},
+            'x-amazon-apigateway-integration': integration,
+        }
+        parameters = [
+            {'name': name, 'in': 'path', 'required': True, 'schema': {'type': 'string'}}
+            for name in PATH_PARAMETER.findall(path)
+        ]
+        if parameters:
+            method['parameters'] = parameters
+        paths[path] = {ANY_METHOD: method}
+
+    return {
+        'openapi': OPENAPI_VERSION,
+        'info': {'title': api_name, 'description': api_description, 'version': '1.0'},
+        'paths': paths,
+        'components': {'schemas': schemas},
+        'x-amazon-apigateway-binary-media-types': binary_types,
+    }
+
+
+def delete_rest_api(api_name):
+    api_client = get_client('apigateway')
+    delete_api_gateway(api_client, api_name)
+
+
+def deploy_to_stage(api_client, api_id, deploy_stage):
+    return api_client.create_deployment(restApiId=api_id, stageName=deploy_stage)
 
 
 def get_root_resource_id(api_client, api_id):
@@ -139,25 +448,13 @@ def delete_api_gateway(api_client, api_name):
     if api_id:
         info(f'Deleting API with ID: {api_id}')
         api_client.delete_rest_api(restApiId=api_id)
+        forget_api(api_client, api_name)
 
 
-def create_api_gateway(api_client, api_name, api_description, binary_types):
-    api_id = lookup_api_gateway(api_client, api_name)
+def lookup_api_gateway(api_client, api_name):
+    api_id = lookup_api_id(api_client, api_name)
     if api_id:
+        info('Found existing API account for %s' % api_name)
         return api_id
-    info(f'No existing API account found for {api_name}, creating it.')
-    result = api_client.create_rest_api(
-        name=api_name, description=api_description, binaryMediaTypes=binary_types
-    )
-    return result['id']
-
-
-def lookup_api_gateway(api_client, api_name):
-    apis = api_client.get_rest_apis()
-    if 'items' in apis:
-        for api in apis['items']:
-            if api['name'] == api_name:
-                info('Found existing API account for %s' % api['name'])
-                return api['id']
     info(f'No API gateway found with name {api_name}')
     return None
@@ -1,5 +1,5 @@
 from logging import debug, info, warn
-import boto3
+from lgw.clients import get_client
 from lgw.api_gateway import lookup_api_gateway
 from lgw.route53 import update_dns_a_record
 
@@ -7,7 +7,7 @@ from lgw.route53 import update_dns_a_record
 def add_domain_mapping(
     api_name, domain_name, base_path, https_certificate_arn, deploy_stage, wait_for_completion
 ):
-    api_client = boto3.client('apigateway')
+    api_client = get_client('apigateway')
 
     api_id = lookup_api_gateway(api_client, api_name)
 
@@ -28,7 +28,7 @@ def add_domain_mapping(
 
 
 def remove_domain_mapping(api_name, domain_name, base_path):
-    api_client = boto3.client('apigateway')
+    api_client = get_client('apigateway')
 
     api_id = lookup_api_gateway(api_client, api_name)
 
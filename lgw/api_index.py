@@ -0,0 +1,139 @@
+'''
+Resolves REST API names to IDs through an index of all the APIs in a region, cached on
+disk between commands.
+
+API Gateway has no lookup by name, so the index is built by paging through every API.
+An ID found in the cache is confirmed with a single `get_rest_api` call, and the index is
+rebuilt when the cache has expired, the ID is gone, or the name is not in the cache.
+'''
+
+import os
+import json
+import time
+from threading import Lock
+from logging import debug, info, warning
+
+DEFAULT_CACHE_FILE = '~/.cache/lgw/api-index.json'
+DEFAULT_TTL = 3600
+REST_APIS_PAGE_SIZE = 500
+
+# The index is only cached on disk once configured, as the command line does.
+_cache_file = None
+_ttl = DEFAULT_TTL
+_lock = Lock()
+
+
+def configure_api_index(cache_file=DEFAULT_CACHE_FILE, ttl=DEFAULT_TTL):
+    '''
+    Sets where the index is cached and for how many seconds it is trusted.  An empty
+    `cache_file` disables the cache, so that every lookup pages through the APIs.
+    '''
+    global _cache_file, _ttl
+    with _lock:
+        _cache_file = os.path.expanduser(cache_file) if cache_file else None
+        _ttl = ttl
+
+
+def lookup_api_id(api_client, api_name):
+    '''
+    Returns the ID of the REST API named `api_name`, or None if there is none.  When
+    several APIs share the name, the first one listed is returned.
+    '''
+    apis = read_index(api_client)
+    api_id = apis.get(api_name)
+    if api_id:
+        try:
+            if api_client.get_rest_api(restApiId=api_id)['name'] == api_name:
+                debug(f'Found API {api_name} in the cached index')
+                return api_id
+        except api_client.exceptions.NotFoundException:
+            pass
+        debug(f'Cached ID {api_id} of API {api_name} is stale')
+
+    apis = build_index(api_client)
+    write_index(api_client, apis)
+    return apis.get(api_name)
+
+
+def remember_api(api_client, api_name, api_id):
+    '''
+    Adds a newly created API to the cached index.
+    '''
+    apis = read_index(api_client)
+    apis.setdefault(api_name, api_id)
+    write_index(api_client, apis, touch=False)
+
+
+def forget_api(api_client, api_name):
+    '''
+    Removes a deleted API from the cached index.
+    '''
+    apis = read_index(api_client)
+    if apis.pop(api_name, None):
+        write_index(api_client, apis, touch=False)
+
+
+def build_index(api_client):
+    '''
+    Pages through the REST APIs of the client's region.
+
+    :return: Dictionary of API name => ID.
+    '''
+    apis = {}
+    paginator = api_client.get_paginator('get_rest_apis')
+    for page in paginator.paginate(PaginationConfig={'PageSize': REST_APIS_PAGE_SIZE}):
+        for api in page['items']:
+            if api['name'] in apis:
+                warning(f'Several APIs are named {api["name"]}, using {apis[api["name"]]}')
+                continue
+            apis[api['name']] = api['id']
+    info(f'Indexed {len(apis)} APIs')
+    return apis
+
+
+def read_index(api_client):
+    '''
+    Returns the cached index for the client's endpoint, or an empty one if it is not
+    cached or has expired.
+    '''
+    entry = load_cache().get(api_client.meta.endpoint_url)
+    if not entry or time.time() - entry['updated'] > _ttl:
+        return {}
+    return entry['apis']
+
+
+def write_index(api_client, apis, touch=True):
+    '''
+    Caches the index for the client's endpoint.
+
+    :param touch: Restart the index's time to live, as when it was just built.
+    '''
+    if not _cache_file:
+        return
+    with _lock:
+        cache = load_cache()
+        endpoint = api_client.meta.endpoint_url
+        updated = time.time()
+        if not touch and endpoint in cache:
+            updated = cache[endpoint]['updated']
+        cache[endpoint] = {'updated': updated, 'apis': apis}
+
+        if os.path.dirname(_cache_file):
+            os.makedirs(os.path.dirname(_cache_file), exist_ok=True)
+        partial = f'{_cache_file}.partial'
+        with open(partial, 'w') as f:
+            json.dump(cache, f)
+        os.replace(partial, _cache_file)
+
+
+def load_cache():
+    if not _cache_file:
+        return {}
+    try:
+        with open(_cache_file) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError:
+        warning(f'Ignoring unreadable API index cache {_cache_file}')
+        return {}
@@ -0,0 +1,325 @@
+'''
+Writes reproducible zip archives, compressing their entries in parallel.
+
+Entries are sorted by name and written with a fixed timestamp and fixed permissions, so
+the same files always produce the same bytes.  This module only uses the standard
+library, so that it can also be run inside the Docker build as a script:
+
+    python3 archiver.py [--level N] [--exclude PATTERN ...] [--bytecode MODE]
+                        [--layer LAYER] OUTPUT DIRECTORY [DIRECTORY ...]
+'''
+
+import os
+import zlib
+import struct
+import argparse
+import posixpath
+import shutil
+import zipfile
+import compileall
+import py_compile
+import multiprocessing
+from fnmatch import fnmatchcase
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_COMPRESSION_LEVEL = 9
+BYTECODE_MODES = ['pyc', 'pyc-only']
+# Lambda adds this directory of a layer to the path of Python functions.
+LAYER_PREFIX = 'python'
+MAP_CHUNKSIZE = 16
+
+# 1980-01-01 00:00:00, the earliest timestamp a zip entry can hold, in DOS format.
+FIXED_DOS_DATE = (0 << 9) | (1 << 5) | 1
+FIXED_DOS_TIME = 0
+FILE_MODE = 0o100644
+EXECUTABLE_MODE = 0o100755
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+ZIP_VERSION = 20
+ZIP_MADE_BY_UNIX = 3 << 8
+ZIP_UTF8_FLAG = 0x800
+ZIP_MAX_SIZE = 0xFFFFFFFF
+ZIP_MAX_ENTRIES = 0xFFFF
+
+LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+CENTRAL_HEADER = struct.Struct('<4s6H3L5H2L')
+END_RECORD = struct.Struct('<4s4H2LH')
+
+
+def tree_entries(directory, prefix=''):
+    '''
+    Yields `(source, arcname)` for every file under `directory`, with arcnames relative to
+    `prefix`, in sorted order.
+    '''
+    for root, dirnames, filenames in os.walk(directory):
+        dirnames.sort()
+        reldir = os.path.relpath(root, directory).replace(os.sep, '/')
+        for filename in sorted(filenames):
+            arcname = posixpath.normpath(posixpath.join(prefix, reldir, filename))
+            yield os.path.join(root, filename), arcname
+
+
+def is_excluded(arcname, patterns):
+    '''
+    Applies `patterns` as `zip --exclude` would: each is matched against the whole
+    arcname, with `*` also matching `/`, so a directory's files are only excluded by a
+    pattern such as `*/bin/*`.  A pattern starting with `!` re-includes what it matches,
+    and the last matching pattern wins.
+    '''
+    excluded = False
+    for pattern in patterns:
+        negated = pattern.startswith('!')
+        if negated:
+            pattern = pattern[1:]
+        if fnmatchcase(arcname, pattern.lstrip('/')):
+            excluded = not negated
+    return excluded
+
+
+def compile_tree(directory, sourceless=False):
+    '''
+    Compiles the Python sources under `directory` with the running interpreter into
+    unchecked-hash pycs, which are used without checking the sources against them.
+
+    :param sourceless: Write each pyc next to its source and remove the source, leaving
+                       only the bytecode.  Sources that fail to compile are kept.
+    '''
+    compileall.compile_dir(
+        directory,
+        quiet=1,
+        force=True,
+        legacy=sourceless,
+        workers=0,
+        invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+    )
+    if not sourceless:
+        return
+    for root, dirnames, filenames in os.walk(directory):
+        if '__pycache__' in dirnames:
+            dirnames.remove('__pycache__')
+            shutil.rmtree(os.path.join(root, '__pycache__'))
+        for filename in filenames:
+            source = os.path.join(root, filename)
+            if filename.endswith('.py') and os.path.exists(source + 'c'):
+                os.remove(source)
+
+
+def write_archive(
+    location,
+    entries,
+    compresslevel=DEFAULT_COMPRESSION_LEVEL,
+    excludes=(),
+    processes=None,
+    prefix='',
+):
+    '''
+    Writes the `(source, arcname)` pairs of `entries` to a reproducible zip at `location`.
+
+    Entries matching `excludes` are skipped, and when an arcname occurs more than once the
+    first occurrence is kept.  Entries are compressed across a pool of `processes`, which
+    defaults to one per CPU.
+
+    :param compresslevel: zlib compression level, from 0 (stored) to 9.
+    :param prefix: Directory to place the entries under, after matching `excludes`.
+    :return: Number of entries written.
+    '''
+    selected = {}
+    for source, arcname in entries:
+        if is_excluded(arcname, excludes):
+            continue
+        if prefix:
+            arcname = posixpath.join(prefix, arcname)
+        selected.setdefault(arcname, source)
+    names = sorted(selected)
+    if len(names) > ZIP_MAX_ENTRIES:
+        raise ValueError(f'Too many entries for a zip archive: {len(names)}')
+
+    jobs = [(selected[name], compresslevel) for name in names]
+    with open(location, 'wb') as out:
+        if processes == 1 or len(jobs) < 2:
+            results = map(compress_entry, jobs)
+            write_entries(out, names, results)
+        else:
+            with ProcessPoolExecutor(max_workers=processes, mp_context=pool_context()) as executor:
+                results = executor.map(compress_entry, jobs, chunksize=MAP_CHUNKSIZE)
+                write_entries(out, names, results)
+    return len(names)
+
+
+def pool_context():
+    '''
+    Returns the context the compression pool starts its processes with.  Forking is
+    avoided, as the archive may be written from a thread of a multi-threaded process, such
+    as one of several architectures building at once.
+    '''
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def update_archive(
+    location, changed, removed=(), compresslevel=DEFAULT_COMPRESSION_LEVEL, excludes=()
+):
+    '''
+    Rewrites the archive at `location` with the `(source, arcname)` pairs of `changed`
+    added or replaced and the arcnames in `removed` dropped.  Only the changed entries are
+    compressed; the others are copied from the existing archive as they are, so the result
+    is the same as writing the whole tree again.
+
+    :return: Number of entries written.
+    '''
+    updates = {}
+    for source, arcname in changed:
+        if not is_excluded(arcname, excludes):
+            updates[arcname] = source
+
+    with zipfile.ZipFile(location) as existing:
+        kept = {i.filename: i for i in existing.infolist() if i.filename not in updates}
+    for arcname in removed:
+        kept.pop(arcname, None)
+    names = sorted(set(kept) | set(updates))
+    if len(names) > ZIP_MAX_ENTRIES:
+        raise ValueError(f'Too many entries for a zip archive: {len(names)}')
+
+    def results(original):
+        for name in names:
+            if name in updates:
+                yield compress_entry((updates[name], compresslevel))
+            else:
+                yield copy_entry(original, kept[name])
+
+    partial = f'{location}.partial'
+    with open(location, 'rb') as original, open(partial, 'wb') as out:
+        write_entries(out, names, results(original))
+    os.replace(partial, location)
+    return len(names)
+
+
+def copy_entry(archive, zinfo):
+    '''
+    Reads the still compressed data of the entry described by `zinfo` from `archive`.
+
+    :return: Tuple as returned by `compress_entry`.
+    '''
+    archive.seek(zinfo.header_offset)
+    header = LOCAL_HEADER.unpack(archive.read(LOCAL_HEADER.size))
+    name_length, extra_length = header[-2:]
+    archive.seek(name_length + extra_length, os.SEEK_CUR)
+    data = archive.read(zinfo.compress_size)
+    executable = bool((zinfo.external_attr >> 16) & 0o111)
+    return zinfo.compress_type, zinfo.CRC, zinfo.file_size, data, executable
+
+
+def compress_entry(job):
+    '''
+    Reads and compresses one file.
+
+    :return: Tuple of the compression method, CRC-32, uncompressed size, compressed data,
+             and whether the file is executable.
+    '''
+    source, compresslevel = job
+    with open(source, 'rb') as f:
+        data = f.read()
+    crc = zlib.crc32(data)
+    executable = bool(os.stat(source).st_mode & 0o111)
+
+    if compresslevel:
+        compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS)
+        compressed = compressor.compress(data) + compressor.flush()
+        if len(compressed) < len(data):
+            return ZIP_DEFLATED, crc, len(data), compressed, executable
+    return ZIP_STORED, crc, len(data), data, executable
+
+
+def write_entries(out, names, results):
+    central_directory = []
+    for name, (method, crc, size, data, executable) in zip(names, results):
+        if size > ZIP_MAX_SIZE or out.tell() > ZIP_MAX_SIZE:
+            raise ValueError(f'Archive too large for a zip without zip64 at [{name}]')
+
+        encoded = name.encode('utf8')
+        flags = 0 if name.isascii() else ZIP_UTF8_FLAG
+        offset = out.tell()
+        out.write(
+            LOCAL_HEADER.pack(
+                b'PK\x03\x04',
+                ZIP_VERSION,
+                flags,
+                method,
+                FIXED_DOS_TIME,
+                FIXED_DOS_DATE,
+                crc,
+                len(data),
+                size,
+                len(encoded),
+                0,
+            )
+        )
+        out.write(encoded)
+        out.write(data)
+
+        mode = EXECUTABLE_MODE if executable else FILE_MODE
+        central_directory.append(
+            CENTRAL_HEADER.pack(
+                b'PK\x01\x02',
+                ZIP_MADE_BY_UNIX | ZIP_VERSION,
+                ZIP_VERSION,
+                flags,
+                method,
+                FIXED_DOS_TIME,
+                FIXED_DOS_DATE,
+                crc,
+                len(data),
+                size,
+                len(encoded),
+                0,
+                0,
+                0,
+                0,
+                mode << 16,
+                offset,
+            )
+            + encoded
+        )
+
+    start = out.tell()
+    for header in central_directory:
+        out.write(header)
+    size = out.tell() - start
+    count = len(central_directory)
+    out.write(END_RECORD.pack(b'PK\x05\x06', 0, 0, count, count, size, start, 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a reproducible zip archive.')
+    parser.add_argument('output', help='Path of the archive to write.')
+    parser.add_argument('directories', nargs='+', help='Directories to add, in priority order.')
+    parser.add_argument('--level', type=int, default=DEFAULT_COMPRESSION_LEVEL)
+    parser.add_argument('--exclude', action='append', default=[])
+    parser.add_argument(
+        '--bytecode',
+        choices=BYTECODE_MODES,
+        help='Compile the first directory, and the others sourceless with pyc-only.',
+    )
+    parser.add_argument(
+        '--layer',
+        help='Write the directories after the first to a layer archive at this path.',
+    )
+    args = parser.parse_args()
+
+    if args.bytecode:
+        compile_tree(args.directories[0])
+        for directory in args.directories[1:]:
+            compile_tree(directory, sourceless=args.bytecode == 'pyc-only')
+    directories = args.directories
+    if args.layer:
+        layer_entries = (entry for d in directories[1:] for entry in tree_entries(d))
+        write_archive(args.layer, layer_entries, args.level, args.exclude, prefix=LAYER_PREFIX)
+        directories = directories[:1]
+    entries = (entry for d in directories for entry in tree_entries(d))
+    write_archive(args.output, entries, args.level, args.exclude)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+'''
+Turns the JSON stream of a Docker image build into typed build events, and collects them
+into a per-step timeline of the build.
+'''
+
+import re
+from collections import namedtuple
+from time import perf_counter
+from logging import debug, info, error
+
+StepStarted = namedtuple('StepStarted', 'number total instruction')
+StepFinished = namedtuple('StepFinished', 'number instruction seconds cached')
+LayerPulled = namedtuple('LayerPulled', 'layer size')
+BuildOutput = namedtuple('BuildOutput', 'text')
+BuildFailed = namedtuple('BuildFailed', 'message')
+ImageBuilt = namedtuple('ImageBuilt', 'image_id')
+
+STEP = re.compile(r'^Step (\d+)/(\d+) : (.*)$')
+USING_CACHE = ' ---> Using cache'
+
+
+def build_events(stream, clock=perf_counter):
+    '''
+    Yields build events for the decoded JSON objects of `stream`, as returned by
+    `APIClient.build(decode=True)`.
+
+    A step is finished when the next one starts or the build ends.  Its `cached` is True
+    when Docker reused a cached layer for it, None for `FROM`, which neither runs nor uses
+    the cache, and False otherwise: Docker only reports running a container for steps such
+    as `RUN`, while an uncached `COPY` just produces its layer.
+    '''
+    step = None
+    started = None
+    cached = None
+    layer_sizes = {}
+
+    def finish():
+        return StepFinished(step.number, step.instruction, clock() - started, cached)
+
+    for message in stream:
+        if message.get('error'):
+            yield BuildFailed(message['error'].strip())
+            continue
+
+        if 'aux' in message and 'ID' in message['aux']:
+            yield ImageBuilt(message['aux']['ID'])
+            continue
+
+        status = message.get('status')
+        if status:
+            layer = message.get('id')
+            total = message.get('progressDetail', {}).get('total')
+            if status == 'Downloading' and total:
+                layer_sizes[layer] = total
+            elif status == 'Download complete' and layer in layer_sizes:
+                yield LayerPulled(layer, layer_sizes.pop(layer))
+            continue
+
+        for line in message.get('stream', '').splitlines():
+            match = STEP.match(line)
+            if match:
+                if step:
+                    yield finish()
+                number, total, instruction = match.groups()
+                step = StepStarted(int(number), int(total), instruction)
+                started = clock()
+                cached = None if instruction.upper().startswith('FROM ') else False
+                yield step
+            elif line.startswith(USING_CACHE):
+                cached = True
+            elif line.strip():
+                yield BuildOutput(line)
+
+    if step:
+        yield finish()
+
+
+def log_event(event):
+    if isinstance(event, StepStarted):
+        info('Step %d/%d: %s' % (event.number, event.total, event.instruction))
+    elif isinstance(event, BuildOutput):
+        debug(event.text)
+    elif isinstance(event, BuildFailed):
+        error(event.message)
+
+
+class BuildTimeline:
+    '''
+    Collects the build events of one image into its per-step timings, cache use and the
+    bytes pulled for base image layers.
+    '''
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.steps = []
+        self.pulled = 0
+        self.errors = []
+        self.image_id = None
+
+    def add(self, event):
+        if isinstance(event, StepFinished):
+            self.steps.append(event)
+        elif isinstance(event, LayerPulled):
+            self.pulled += event.size
+        elif isinstance(event, BuildFailed):
+            self.errors.append(event.message)
+        elif isinstance(event, ImageBuilt):
+            self.image_id = event.image_id
+
+    @property
+    def seconds(self):
+        return sum(step.seconds for step in self.steps)
+
+    def summary(self):
+        ran = [step for step in self.steps if step.cached is False]
+        lines = [
+            'Built %s in %.1fs: %d of %d steps cached, %.1f MB pulled'
+            % (
+                self.tag,
+                self.seconds,
+                sum(1 for step in self.steps if step.cached),
+                len(self.steps),
+                self.pulled / (1024 * 1024),
+            )
+        ]
+        for step in sorted(ran, key=lambda step: -step.seconds):
+            lines.append('  %7.1fs  %s' % (step.seconds, step.instruction))
+        return '\n'.join(lines)
+
+    def as_dict(self):
+        return {
+            'tag': self.tag,
+            'image_id': self.image_id,
+            'seconds': self.seconds,
+            'bytes_pulled': self.pulled,
+            'errors': self.errors,
+            'steps': [step._asdict() for step in self.steps],
+        }
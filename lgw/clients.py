@@ -0,0 +1,95 @@
+from threading import Lock
+from logging import debug
+
+DEFAULT_MAX_POOL_CONNECTIONS = 10
+DEFAULT_RETRY_MODE = 'standard'
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 60
+
+# boto3 is imported on first use rather than at module load, so that commands which never
+# talk to AWS do not pay for importing it.
+_session = None
+_config = None
+_config_args = {}
+_clients = {}
+_lock = Lock()
+
+
+def client_config(
+    max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS,
+    retry_mode=DEFAULT_RETRY_MODE,
+    max_attempts=DEFAULT_MAX_ATTEMPTS,
+    connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+    read_timeout=DEFAULT_READ_TIMEOUT,
+):
+    from botocore.config import Config
+
+    return Config(
+        max_pool_connections=int(max_pool_connections),
+        retries={'mode': retry_mode, 'max_attempts': int(max_attempts)},
+        connect_timeout=int(connect_timeout),
+        read_timeout=int(read_timeout),
+    )
+
+
+def configure_clients(**kwargs):
+    '''
+    Sets the `botocore` config used by every client handed out by `get_client`, discarding
+    any clients already created.  Takes the keyword arguments of `client_config`.
+    '''
+    global _config, _config_args
+    with _lock:
+        _config = None
+        _config_args = kwargs
+        _clients.clear()
+
+
+def reset_clients():
+    '''
+    Discards the shared session, config and clients, so that the next `get_client` starts
+    from scratch.
+    '''
+    global _session, _config, _config_args
+    with _lock:
+        _session = None
+        _config = None
+        _config_args = {}
+        _clients.clear()
+
+
+def get_client(service_name, region_name=None, max_pool_connections=None):
+    '''
+    Returns the shared client for `service_name` in `region_name`, creating it from a single
+    session on first use so that service models and connection pools are reused.
+
+    :param region_name: Region of the client, or None for the session's default region.
+    :param max_pool_connections: Optional pool size for callers needing more connections than
+                                 the configured default; such clients are shared separately.
+    '''
+    key = (service_name, region_name, max_pool_connections)
+    client = _clients.get(key)
+    if client:
+        return client
+
+    global _session, _config
+    with _lock:
+        client = _clients.get(key)
+        if client:
+            return client
+
+        if _session is None:
+            import boto3.session
+
+            _session = boto3.session.Session()
+        if _config is None:
+            _config = client_config(**_config_args)
+
+        config = _config
+        if max_pool_connections:
+            config = client_config(**{**_config_args, 'max_pool_connections': max_pool_connections})
+
+        debug('Creating [%s] client for region [%s]' % (service_name, region_name))
+        client = _session.client(service_name, region_name=region_name, config=config)
+        _clients[key] = client
+        return client
@@ -1,18 +1,39 @@
-import docker
-from io import BytesIO
+from io import BytesIO, RawIOBase
 import json
-import ast
 import tarfile
 import os
-import tempfile
+import shutil
+import re
+import posixpath
+from threading import Thread
+from hashlib import sha256
+import shlex
 from os.path import exists
 
-from logging import debug, info, warning, error, getLogger, DEBUG
+from lgw import archiver
+from lgw.archiver import DEFAULT_COMPRESSION_LEVEL, BYTECODE_MODES, tree_entries
+from lgw.build_events import build_events, log_event, BuildTimeline
+
+from logging import debug, info, warning, error
+
+# docker is imported where it is used, so that lgw.native_bundle can share these settings
+# without loading the Docker SDK.
 
 PYTHON_VERSION = '3.12'
-ARCH = '-arm64'
-BASE_IMAGE = f'public.ecr.aws/shogo82148/lambda-python:build-{PYTHON_VERSION}.2024.10.18{ARCH}'
+DEFAULT_ARCHITECTURE = 'arm64'
+BASE_IMAGE = (
+    'public.ecr.aws/shogo82148/lambda-python:build-{python_version}.2024.10.18-{architecture}'
+)
+DOCKER_PLATFORMS = {'arm64': 'linux/arm64', 'x86_64': 'linux/amd64'}
 DOCKER_SOCKET_FILE = '/var/run/docker.sock'
+DEPS_IMAGE = 'lambda-bundle-deps'
+BUNDLE_IMAGE = 'lambda-bundle'
+DEPS_HASH_LENGTH = 16
+CONTEXT_CHUNK_SIZE = 64 * 1024
+ARCHIVER_SCRIPT = 'lgw_archiver.py'
+WHEELHOUSE_DIR = '/home/wheelhouse/'
+PIP_CACHE_DIR = '/home/pip-cache/'
+CONTAINER_TMP_DIR = '/tmp/'
 DEFAULT_CODE_HOME = '/home/code/'
 DEFAULT_VENV_HOME = '/home/venv/'
 DEFAULT_OUTPUT_DIR = '/home/build/'
@@ -28,6 +49,33 @@ ZIP_EXCLUDES = [
     '*setuptools/*',
     '*pkg_resources/*',
 ]
+# Left out of ZIP_EXCLUDES when the archive is compiled to bytecode.
+BYTECODE_EXCLUDES = ['*__pycache__*', '*.pyc']
+
+# Opt-in exclusions.  `strip` has no patterns: it strips the debug symbols from shared
+# libraries.  `botocore` keeps the data of the services named in `botocore_services` only.
+PRUNE_PROFILES = {
+    'tests': ['tests/*', '*/tests/*', 'test/*', '*/test/*', 'conftest.py', '*/conftest.py'],
+    'docs': [
+        'docs/*',
+        '*/docs/*',
+        'doc/*',
+        '*/doc/*',
+        'examples/*',
+        '*/examples/*',
+        '*.md',
+        '*.rst',
+    ],
+    'stubs': ['*.pyi', '*-stubs/*'],
+    'botocore': ['botocore/data/*', 'boto3/data/*'],
+    'strip': [],
+}
+BOTOCORE_DATA_FILES = [
+    '_retry.json',
+    'endpoints.json',
+    'partitions.json',
+    'sdk-default-configuration.json',
+]
 
 DEFAULT_DOCKERIGNORE = [
     '**/.DS_Store',
@@ -54,50 +102,281 @@ def build_lambda_archive(
     lambda_archive_filename,
     addl_project_files=[],
     addl_system_packages=[],
+    compresslevel=DEFAULT_COMPRESSION_LEVEL,
+    pip_cache_dir=None,
+    wheelhouse=None,
+    excludes=ZIP_EXCLUDES,
+    strip_symbols=False,
+    bytecode=None,
+    python_version=PYTHON_VERSION,
+    architecture=DEFAULT_ARCHITECTURE,
+    layer=False,
+    build_report=None,
 ):
+    '''
+    Builds a lambda archive in Docker and copies it to `lambda_archive_dir`.
+
+    :param pip_cache_dir: Optional host directory mounted as pip's cache while installing
+                          dependencies, so that downloads and built wheels persist across
+                          builds.
+    :param wheelhouse: Optional host directory of pre-fetched wheels.  When given, pip only
+                       installs from it, so the build needs no network access.
+    :param excludes: Patterns of the files left out of the archive, see `archive_excludes`.
+    :param strip_symbols: Whether to strip debug symbols from shared libraries.
+    :param bytecode: `pyc` to compile the code and dependencies to unchecked-hash pycs
+                     with the lambda's interpreter, or `pyc-only` to also remove the
+                     sources of the dependencies.
+    :param python_version: Python version of the lambda runtime, e.g. `3.12`.
+    :param architecture: Instruction set of the lambda, `arm64` or `x86_64`.  Images of
+                         another architecture than the host's are run under emulation.
+    :param layer: Write the dependencies to a separate layer archive, named as given by
+                  `layer_archive_name`, next to the archive of the code.
+    :param build_report: Optional path to write the per-step timings of the image builds
+                         to, as JSON.
+    '''
     if not exists(DOCKER_SOCKET_FILE):
         error(f'Docker listen socket not found at {DOCKER_SOCKET_FILE}')
         raise FileNotFoundError(
             f'Docker listen socket not found at {DOCKER_SOCKET_FILE}, is Docker running?'
         )
 
+    import docker
+
+    cli = docker.APIClient(base_url=f'unix://{DOCKER_SOCKET_FILE}')
+
+    with open(os.path.join(context_dir, 'requirements.txt'), 'rb') as f:
+        requirements = f.read()
+    image = base_image(python_version, architecture)
+    platform = DOCKER_PLATFORMS[architecture]
+    deps_dockerfile = create_deps_dockerfile(addl_system_packages, bool(wheelhouse), image)
+    deps_hash = dependency_hash(deps_dockerfile, requirements, wheelhouse)
+    deps_tag = f'{DEPS_IMAGE}:{deps_hash}'
+    timelines = []
+
+    if image_exists(cli, deps_tag):
+        info(f'Dependencies unchanged, reusing image {deps_tag}')
+    elif pip_cache_dir:
+        info(f'Installing dependencies into image {deps_tag} with pip cache {pip_cache_dir}')
+        install_deps_with_cache(
+            docker.from_env(),
+            deps_hash,
+            requirements,
+            pip_cache_dir,
+            wheelhouse,
+            image,
+            platform,
+        )
+    else:
+        info(f'Building dependency image {deps_tag}')
+        debug(deps_dockerfile)
+        context = create_deps_context(deps_dockerfile, requirements, wheelhouse)
+        timelines.append(build_image(cli, context, deps_tag, platform))
+
     info('Assembling Dockerfile.')
     dockerfile = create_dockerfile(
-        lambda_archive_filename, addl_project_files, addl_system_packages
+        lambda_archive_filename,
+        addl_project_files,
+        deps_tag,
+        compresslevel,
+        excludes,
+        strip_symbols,
+        bytecode,
+        python_version,
+        layer,
     )
     debug(dockerfile)
 
-    tag = 'lambda-bundle:latest'
+    tag = f'{BUNDLE_IMAGE}:{python_version}-{architecture}'
 
     info(f'Building docker image based on files in {context_dir}')
-    with tempfile.NamedTemporaryFile() as tmp:
-        create_docker_context(dockerfile, context_dir, tmp.name)
-        cli = docker.APIClient(base_url=f'unix://{DOCKER_SOCKET_FILE}')
-        for line in cli.build(fileobj=tmp, custom_context=True, encoding='gzip', tag=tag):
-            print_progress(line)
+    context = stream_docker_context(dockerfile, context_dir)
+    timelines.append(build_image(cli, context, tag, platform))
+    if build_report:
+        write_build_report(build_report, timelines)
 
     info('Running docker image to build lambda archive.')
     client = docker.from_env()
-    container = client.containers.run(tag, command='/bin/sh', detach=True)
+    container = client.containers.run(tag, command='/bin/sh', detach=True, platform=platform)
+    try:
+        if layer:
+            info('Extracting layer archive from running container.')
+            extract_file(container, lambda_archive_dir, layer_archive_name(lambda_archive_filename))
+        info('Extracting lambda archive from running container.')
+        return extract_file(container, lambda_archive_dir, lambda_archive_filename)
+    finally:
+        container.remove(force=True)
 
-    info('Extracting lambda archive from running container.')
-    bits, _ = container.get_archive(f'{DEFAULT_OUTPUT_DIR}/{lambda_archive_filename}')
-    location = write_file_from_tar(bits, lambda_archive_dir, lambda_archive_filename)
 
-    container.stop()
+def extract_file(container, dest, archive_filename):
+    bits, _ = container.get_archive(
+        f'{DEFAULT_OUTPUT_DIR}/{archive_filename}', chunk_size=CONTEXT_CHUNK_SIZE
+    )
+    return write_file_from_tar(bits, dest, archive_filename)
 
-    return location
 
+def build_image(cli, context, tag, platform=None):
+    '''
+    Builds an image tagged `tag` from the tar build `context`, a file or an iterable of
+    chunks.  The context is sent uncompressed, as it only travels over the local socket.
+
+    :raises docker.errors.BuildError: if a step of the build fails.
+    :return: `BuildTimeline` of the build.
+    '''
+    import docker
+
+    timeline = BuildTimeline(tag)
+    log = []
+    stream = cli.build(
+        fileobj=context, custom_context=True, tag=tag, platform=platform, decode=True
+    )
+    for event in build_events(log_stream(stream, log)):
+        log_event(event)
+        timeline.add(event)
+    info(timeline.summary())
+    if timeline.errors:
+        raise docker.errors.BuildError(timeline.errors[-1], log)
+    return timeline
+
+
+def log_stream(stream, log):
+    for message in stream:
+        log.append(message)
+        yield message
+
+
+def write_build_report(location, timelines):
+    with open(location, 'w') as f:
+        json.dump({'builds': [t.as_dict() for t in timelines]}, f, indent=2)
+    info(f'Wrote build report to {location}')
+
+
+def base_image(python_version=PYTHON_VERSION, architecture=DEFAULT_ARCHITECTURE):
+    if architecture not in DOCKER_PLATFORMS:
+        raise ValueError(f'Unsupported architecture: {architecture}')
+    return BASE_IMAGE.format(python_version=python_version, architecture=architecture)
+
+
+def layer_archive_name(filename):
+    '''
+    Returns the name of the layer archive holding the dependencies of the archive named
+    `filename`: `lambda-bundle.zip` has its layer in `lambda-bundle-layer.zip`.
+    '''
+    stem, extension = os.path.splitext(filename)
+    return f'{stem}-layer{extension}'
 
-def create_dockerfile(archive_filename, addl_project_files, addl_system_packages):
-    sys_packages = ' '.join(set(DEFAULT_PACKAGES + addl_system_packages))
-    zip_excludes = ' '.join(set(ZIP_EXCLUDES))
-    addl_files = ''
-    for files in addl_project_files:
-        # addl_project_files is a list of tuples
-        addl_files += 'COPY %s %s' % files
 
-    dockerfile = f'''FROM {BASE_IMAGE} AS base
+def target_archive_name(filename, architecture):
+    '''
+    Returns the name of the archive built for `architecture` when several are built at
+    once: `lambda-bundle.zip` becomes `lambda-bundle-arm64.zip`.
+    '''
+    stem, extension = os.path.splitext(filename)
+    return f'{stem}-{architecture}{extension}'
+
+
+def image_exists(cli, tag):
+    import docker.errors
+
+    try:
+        cli.inspect_image(tag)
+    except docker.errors.ImageNotFound:
+        return False
+    return True
+
+
+def dependency_hash(deps_dockerfile, requirements, wheelhouse=None):
+    '''
+    Hashes the inputs of the dependency image: its Dockerfile, which names the base image
+    and system packages, the contents of `requirements.txt`, and the names and sizes of
+    the wheels in `wheelhouse` if one is given.
+    '''
+    digest = sha256(deps_dockerfile.encode('utf8'))
+    digest.update(requirements)
+    if wheelhouse:
+        for source, arcname in tree_entries(wheelhouse):
+            digest.update(f'{arcname}:{os.stat(source).st_size}\n'.encode('utf8'))
+    return digest.hexdigest()[:DEPS_HASH_LENGTH]
+
+
+def pip_install_script(wheelhouse=False):
+    '''
+    Returns the shell commands that install `requirements.txt` into the virtualenv, from
+    `WHEELHOUSE_DIR` only when `wheelhouse` is set.
+    '''
+    options = f' --no-index --find-links {WHEELHOUSE_DIR}' if wheelhouse else ''
+    return f'''python3 -m venv $venv && \
+ source $venv/bin/activate && \
+ pip install{options} -U pip && \
+ pip install{options} -r requirements.txt && \
+ deactivate'''
+
+
+def install_deps_with_cache(
+    client, deps_hash, requirements, pip_cache_dir, wheelhouse=None, image=None, platform=None
+):
+    '''
+    Creates the dependency image by running the install in a container of the base image
+    with `pip_cache_dir` mounted as pip's cache, which a Dockerfile build cannot do, and
+    committing the container as `DEPS_IMAGE:deps_hash`.
+    '''
+    script = f'''mkdir -p $wkdir $venv $output && \
+ cp {CONTAINER_TMP_DIR}requirements.txt $wkdir && \
+ cd $wkdir && \
+ {pip_install_script(bool(wheelhouse))} && \
+ echo "source $venv/bin/activate" >> $HOME/.profile'''
+    debug(script)
+
+    volumes = {os.path.abspath(pip_cache_dir): {'bind': PIP_CACHE_DIR, 'mode': 'rw'}}
+    if wheelhouse:
+        volumes[os.path.abspath(wheelhouse)] = {'bind': WHEELHOUSE_DIR, 'mode': 'ro'}
+
+    import docker.errors
+
+    image = image or base_image()
+    options = dict(
+        command=['/bin/sh', '-c', script],
+        user='root',
+        environment={
+            'wkdir': DEFAULT_CODE_HOME,
+            'venv': DEFAULT_VENV_HOME,
+            'output': DEFAULT_OUTPUT_DIR,
+            'PIP_CACHE_DIR': PIP_CACHE_DIR,
+        },
+        volumes=volumes,
+        platform=platform,
+    )
+    try:
+        container = client.containers.create(image, **options)
+    except docker.errors.ImageNotFound:
+        # Unlike `containers.run`, `containers.create` does not pull a missing image.
+        info(f'Pulling base image {image}')
+        client.images.pull(image, platform=platform)
+        container = client.containers.create(image, **options)
+    try:
+        container.put_archive(CONTAINER_TMP_DIR, tar_of({'requirements.txt': requirements}))
+        container.start()
+        for line in container.logs(stream=True, follow=True):
+            debug(line.decode('utf8', errors='replace').rstrip())
+        status = container.wait()
+        if status.get('StatusCode'):
+            raise RuntimeError(
+                f'Installing dependencies failed with exit code {status["StatusCode"]}'
+            )
+        container.commit(
+            repository=DEPS_IMAGE,
+            tag=deps_hash,
+            changes=[f'WORKDIR {DEFAULT_CODE_HOME}', 'ENV PIP_CACHE_DIR=', 'CMD ["/bin/sh"]'],
+        )
+    finally:
+        container.remove(force=True)
+
+
+def create_deps_dockerfile(addl_system_packages, wheelhouse=False, image=None):
+    image = image or base_image()
+    sys_packages = ' '.join(sorted(set(DEFAULT_PACKAGES + addl_system_packages)))
+    copy_wheelhouse = f'COPY wheelhouse {WHEELHOUSE_DIR}\n' if wheelhouse else ''
+
+    return f'''FROM {image} AS base
 # Switch to root user to perform installations
 USER root
 # Set ARGs for directories
@@ -110,23 +389,111 @@ ARG output={DEFAULT_OUTPUT_DIR}
 # Create working directories & change to working dir
 RUN mkdir -p $wkdir $venv $output
 WORKDIR $wkdir
-{addl_files}
 # Set up virtual environment and install dependencies
 COPY requirements.txt ./
-RUN python3 -m venv $venv && \
- source $venv/bin/activate && \
- pip install -U pip && \
- pip install -r requirements.txt && \
- deactivate
+{copy_wheelhouse}RUN {pip_install_script(wheelhouse)}
 # Activate virtual env on login
 RUN echo "source $venv/bin/activate" >> $HOME/.profile
-# Package the code and dependencies into the output zip in one RUN command
-RUN cd $wkdir && \
-zip -9 -r $output/{archive_filename} . \
- --exclude {zip_excludes} && \
-cd $venv/lib/python{PYTHON_VERSION}/site-packages && \
-zip -9 -r -u $output/{archive_filename} . \
- --exclude {zip_excludes}
+'''
+
+
+def create_deps_context(deps_dockerfile, requirements, wheelhouse=None):
+    '''
+    Returns a tar holding only the `deps_dockerfile`, `requirements.txt` and the optional
+    `wheelhouse`, so that the dependency image is built without sending the project to
+    Docker.
+    '''
+    files = {'Dockerfile': deps_dockerfile.encode('utf8'), 'requirements.txt': requirements}
+    trees = [(wheelhouse, 'wheelhouse')] if wheelhouse else []
+    return tar_of(files, trees)
+
+
+def tar_of(files, trees=()):
+    '''
+    Returns an in-memory tar of the given mapping of names to contents, followed by the
+    files of each `(directory, prefix)` pair of `trees`.
+    '''
+    buffer = BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as tar:
+        for name, data in files.items():
+            tinfo = tarfile.TarInfo(name=name)
+            tinfo.size = len(data)
+            tar.addfile(tinfo, BytesIO(data))
+        for directory, prefix in trees:
+            for source, arcname in tree_entries(directory, prefix):
+                tar.add(source, arcname=arcname, recursive=False)
+    buffer.seek(0)
+    return buffer
+
+
+def archive_excludes(prune=(), botocore_services=(), bytecode=None):
+    '''
+    Returns the patterns of the `prune` profiles followed by `ZIP_EXCLUDES`, which come
+    last so that the exceptions of a profile never re-include what they leave out.
+
+    :param prune: Names of `PRUNE_PROFILES` to apply.
+    :param botocore_services: Services whose botocore and boto3 data are kept by the
+                              `botocore` profile.
+    :param bytecode: Bytecode mode of the archive, in which case pycs are kept.
+    '''
+    unknown = set(prune) - set(PRUNE_PROFILES)
+    if unknown:
+        raise ValueError(f'Unknown prune profiles: {", ".join(sorted(unknown))}')
+    if bytecode and bytecode not in BYTECODE_MODES:
+        raise ValueError(f'Unknown bytecode mode: {bytecode}')
+
+    excludes = []
+    for profile in prune:
+        if profile == 'botocore' and not botocore_services:
+            warning('Not pruning botocore data, no botocore services are configured.')
+            continue
+        excludes += PRUNE_PROFILES[profile]
+        if profile == 'botocore':
+            excludes += [f'!botocore/data/{name}' for name in BOTOCORE_DATA_FILES]
+            for service in botocore_services:
+                excludes += [f'!botocore/data/{service}/*', f'!boto3/data/{service}/*']
+    if bytecode:
+        return excludes + [e for e in ZIP_EXCLUDES if e not in BYTECODE_EXCLUDES]
+    return excludes + ZIP_EXCLUDES
+
+
+def create_dockerfile(
+    archive_filename,
+    addl_project_files,
+    deps_image,
+    compresslevel=DEFAULT_COMPRESSION_LEVEL,
+    excludes=ZIP_EXCLUDES,
+    strip_symbols=False,
+    bytecode=None,
+    python_version=PYTHON_VERSION,
+    layer=False,
+):
+    zip_excludes = ' '.join('--exclude %s' % shlex.quote(e) for e in excludes)
+    archiver_options = f'--bytecode {bytecode} ' if bytecode else ''
+    if layer:
+        archiver_options += f'--layer $output/{layer_archive_name(archive_filename)} '
+    site_packages = f'$venv/lib/python{python_version}/site-packages'
+    strip = ''
+    if strip_symbols:
+        strip = f'''# Strip debug symbols from shared libraries
+RUN find {site_packages} -name '*.so*' -type f -exec strip --strip-debug {{}} +
+'''
+    addl_files = ''
+    for files in addl_project_files:
+        # addl_project_files is a list of tuples
+        addl_files += 'COPY %s %s\n' % files
+
+    dockerfile = f'''FROM {deps_image}
+ARG wkdir={DEFAULT_CODE_HOME}
+ARG venv={DEFAULT_VENV_HOME}
+ARG output={DEFAULT_OUTPUT_DIR}
+WORKDIR $wkdir
+{addl_files}
+COPY requirements.txt ./
+COPY {ARCHIVER_SCRIPT} /home/
+{strip}# Package the code and dependencies into a reproducible zip, compressed in parallel
+RUN python3 /home/{ARCHIVER_SCRIPT} --level {compresslevel} {archiver_options}{zip_excludes} \
+ $output/{archive_filename} $wkdir {site_packages}
 '''
 
     return dockerfile
@@ -136,69 +503,194 @@ def write_file_from_tar(data, dest, archive_filename):
     '''
     Extracts a single file named `archive_filename` from a tar
     file encoded in the stream `data` to the given location `dest`.
+    The tar is read as it arrives, and the file is copied straight to its destination.
     Returns the new location of the extracted file.
     '''
-    with tempfile.NamedTemporaryFile() as temp:
-        for chunk in data:
-            temp.write(chunk)
-        temp.flush()
-        os.fsync(temp)
-        with tarfile.open(name=temp.name) as tf:
+    location = f'{dest}/{archive_filename}'
+    with tarfile.open(fileobj=ChunkReader(data), mode='r|') as tf:
+        for tinfo in tf:
+            debug(f'>    {tinfo.name}')
+            if tinfo.name == archive_filename and tinfo.isfile():
+                with open(location, 'wb') as out:
+                    shutil.copyfileobj(tf.extractfile(tinfo), out, CONTEXT_CHUNK_SIZE)
+                return location
+    raise FileNotFoundError(f'{archive_filename} not found in archive from container')
 
-            logger = getLogger(__name__)
-            if logger.isEnabledFor(DEBUG):
-                for tinfo in tf.getnames():
-                    debug(f'>    {tinfo}')
 
-            tf.extract(archive_filename, path=dest)
-    return f'{dest}/{archive_filename}'
+class ChunkReader(RawIOBase):
+    '''
+    Readable file over an iterable of byte chunks, such as a Docker API response stream.
+    '''
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.pending = b''
 
+    def readable(self):
+        return True
 
-def create_docker_context(dockerfile, context_directory, context_file):
+    def readinto(self, buffer):
+        while not self.pending:
+            self.pending = next(self.chunks, None)
+            if self.pending is None:
+                self.pending = b''
+                return 0
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+def stream_docker_context(dockerfile, context_directory):
     '''
-    Collects the `context_directory` into a tar file
-    along with the given `dockerfile`.
-    Returns the filename containing the given context.
+    Yields the build context of `create_docker_context` in chunks as it is written, through
+    a pipe fed by a writer thread, so that the context is never held in memory or spooled
+    to disk.
     '''
+    read_fd, write_fd = os.pipe()
+    failure = []
 
-    def tar_exclude_filter(ti):
-        for item in DEFAULT_DOCKERIGNORE:
-            if item in ti.name:
-                return None
-        return ti
+    def write():
+        try:
+            with os.fdopen(write_fd, 'wb') as pipe:
+                create_docker_context(dockerfile, context_directory, pipe)
+        except Exception as e:
+            failure.append(e)
+
+    writer = Thread(target=write, daemon=True)
+    writer.start()
+    with os.fdopen(read_fd, 'rb') as pipe:
+        for chunk in iter(lambda: pipe.read(CONTEXT_CHUNK_SIZE), b''):
+            yield chunk
+    writer.join()
+    if failure:
+        raise failure[0]
+
+
+def create_docker_context(dockerfile, context_directory, fileobj):
+    '''
+    Writes the `context_directory` as an uncompressed tar stream to `fileobj`, along with
+    the given `dockerfile` and the `lgw.archiver` script that packages the bundle.  Paths
+    matched by `DEFAULT_DOCKERIGNORE` or the project's `.dockerignore` are left out, as
+    by `walk_context`.
+    '''
+    patterns = read_dockerignore(context_directory)
+
+    with tarfile.open(fileobj=fileobj, mode='w|') as tar:
+        for path, relpath in walk_context(context_directory, patterns):
+            if relpath == 'Dockerfile':
+                continue
+            tar.add(path, arcname=relpath, recursive=False)
+            if not os.path.isdir(path):
+                debug(f'>    {relpath}')
 
-    with tarfile.open(context_file, 'w:gz') as tar:
-        tar.add(
-            context_directory,
-            arcname=os.path.basename(context_directory),
-            filter=tar_exclude_filter,
-        )
         dockerfile_bytes = dockerfile.encode('utf8')
         info = tarfile.TarInfo(name='Dockerfile')
         info.size = len(dockerfile_bytes)
         tar.addfile(info, BytesIO(dockerfile_bytes))
 
-        logger = getLogger(__name__)
-        if logger.isEnabledFor(DEBUG):
-            for tinfo in tar.getnames():
-                debug(f'>    {tinfo}')
-
-
-def print_progress(line):
-    s = line.decode('utf8')
-    if s:
-        for l in s.split('\r\n'):
-            if l.strip():
-                try:
-                    dd = ast.literal_eval(l.strip())
-                except Exception:
-                    warning(l)
-                else:
-                    if 'stream' in dd:
-                        ss = dd['stream']
-                        if ss:
-                            debug(ss.strip())
-                    if 'error' in dd:
-                        ee = dd['error']
-                        if ee:
-                            error(ee.strip())
+        tar.add(archiver.__file__, arcname=ARCHIVER_SCRIPT, recursive=False)
+
+
+def walk_context(context_directory, patterns, top='.'):
+    '''
+    Yields `(path, relpath)` for the directories and files under `top` that `patterns` do
+    not ignore, each directory before its contents, with `relpath` relative to the
+    `context_directory`.  Ignored directories are not walked into unless an exception
+    pattern (`!pattern`) may re-include something below them.
+    '''
+    has_exceptions = any(negated for _, negated in patterns)
+    for root, dirnames, filenames in os.walk(os.path.join(context_directory, top)):
+        reldir = os.path.relpath(root, context_directory)
+        reldir = '' if reldir == '.' else reldir.replace(os.sep, '/') + '/'
+
+        for dirname in sorted(dirnames):
+            relpath = reldir + dirname
+            if is_ignored(relpath, patterns):
+                if not has_exceptions:
+                    dirnames.remove(dirname)
+                continue
+            yield os.path.join(root, dirname), relpath
+
+        for filename in sorted(filenames):
+            relpath = reldir + filename
+            if not is_ignored(relpath, patterns):
+                yield os.path.join(root, filename), relpath
+        dirnames.sort()
+
+
+def read_dockerignore(context_directory):
+    '''
+    Returns the compiled `DEFAULT_DOCKERIGNORE` patterns followed by those of the project's
+    `.dockerignore`, if it has one.
+    '''
+    patterns = list(DEFAULT_DOCKERIGNORE)
+    dockerignore = os.path.join(context_directory, '.dockerignore')
+    if exists(dockerignore):
+        with open(dockerignore) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    patterns.append(line)
+    return [compile_dockerignore_pattern(p) for p in patterns]
+
+
+def compile_dockerignore_pattern(pattern):
+    '''
+    Compiles a `.dockerignore` pattern into a regular expression matching the paths it
+    excludes, relative to the context root.  As with Docker, `*` and `?` do not match `/`,
+    `**` matches any number of directories, and a pattern matching a directory matches
+    everything below it.
+
+    :return: Tuple of the compiled expression and whether the pattern is an exception.
+    '''
+    negated = pattern.startswith('!')
+    if negated:
+        pattern = pattern[1:].strip()
+    pattern = posixpath.normpath(pattern.strip('/'))
+
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+            continue
+        if pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+            continue
+        c = pattern[i]
+        if c == '*':
+            regex += '[^/]*'
+        elif c == '?':
+            regex += '[^/]'
+        elif c == '[' and pattern.find(']', i + 1) != -1:
+            j = pattern.find(']', i + 1)
+            char_class = pattern[i + 1 : j]
+            if char_class.startswith('^') or char_class.startswith('!'):
+                char_class = '^' + char_class[1:]
+            regex += '[' + char_class + ']'
+            i = j + 1
+            continue
+        elif c == '\\' and i + 1 < len(pattern):
+            regex += re.escape(pattern[i + 1])
+            i += 2
+            continue
+        else:
+            regex += re.escape(c)
+        i += 1
+
+    return re.compile(regex + '(?:/.*)?'), negated
+
+
+def is_ignored(relpath, patterns):
+    '''
+    Returns whether `relpath` is excluded by `patterns`; as with Docker, the last pattern
+    matching the path decides.
+    '''
+    ignored = False
+    for regex, negated in patterns:
+        if regex.fullmatch(relpath):
+            ignored = not negated
+    return ignored
@@ -1,10 +1,23 @@
-from os import stat
-import boto3
+from os import stat, listdir, path
+from math import ceil
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
+from mmap import mmap, ACCESS_READ
+from contextlib import ExitStack
+from base64 import b64encode
+from zipfile import ZipFile
+from botocore.exceptions import BotoCoreError, ClientError
 import json
 from logging import debug, info
-from lgw.s3 import upload_file
+from lgw.clients import get_client
+from lgw.s3 import upload_file, DEFAULT_MULTIPART_CHUNKSIZE, DEFAULT_MAX_CONCURRENCY
+from lgw.util import file_sha256, MAX_LAMBDA_SIZE
 
-MAX_LAMBDA_SIZE = 50000000
+LAYER_DESCRIPTION = 'sha256:%s'
+DEFAULT_BATCH_CONCURRENCY = 10
+ELF_MAGIC = b'\x7fELF'
+ELF_HEADER_SIZE = 20
+ELF_MACHINES = {62: 'x86_64', 183: 'arm64'}
 
 
 def deploy_function(
@@ -22,8 +35,21 @@ def deploy_function(
     vpc_security_groups,
     environment,
     tags,
+    s3_content_addressed=False,
+    s3_multipart_chunksize=DEFAULT_MULTIPART_CHUNKSIZE,
+    s3_max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    architecture=None,
+    layer_archive=None,
+    layer_name=None,
 ):
+    '''
+    Deploys the function with the code in `archive`, or in `s3_key` of `s3_bucket` if no
+    archive is given.
 
+    :param layer_archive: Optional archive of the dependencies, published as a version of
+                          the layer `layer_name` when its content changed and attached
+                          to the function in place of any other layers.
+    '''
     env = {}
     if environment:
         env = dict(item.split('=') for item in environment.split(';'))
@@ -38,6 +64,42 @@ def deploy_function(
         sec_grps = vpc_security_groups.split(',')
         vpc_config = {'SubnetIds': subnets, 'SecurityGroupIds': sec_grps}
 
+    layers = None
+    if layer_archive:
+        architecture = resolve_architecture(layer_archive, architecture)
+        layers = [
+            publish_layer(
+                layer_name,
+                layer_archive,
+                runtime,
+                architecture,
+                s3_bucket,
+                s3_multipart_chunksize,
+                s3_max_concurrency,
+            )
+        ]
+
+    if archive:
+        architecture = resolve_architecture(archive, architecture)
+
+    if archive and is_code_unchanged(archive, lambda_name, architecture):
+        info('Code of lambda [%s] is unchanged, updating configuration only.' % lambda_name)
+        return create_or_replace_function(
+            lambda_name,
+            None,
+            handler_name,
+            execution_role,
+            connection_timeout,
+            memory_size,
+            runtime,
+            description,
+            vpc_config,
+            env,
+            t,
+            architecture=architecture,
+            layers=layers,
+        )
+
     if archive:
         sz = stat(archive).st_size
     else:
@@ -57,10 +119,19 @@ def deploy_function(
             vpc_config,
             env,
             t,
+            architecture=architecture,
+            layers=layers,
         )
     else:
         if archive:
-            upload_file(s3_bucket, s3_key, archive)
+            s3_key = upload_file(
+                s3_bucket,
+                s3_key,
+                archive,
+                s3_content_addressed,
+                s3_multipart_chunksize,
+                s3_max_concurrency,
+            )
 
         return deploy_function_from_s3(
             lambda_name,
@@ -75,7 +146,151 @@ def deploy_function(
             vpc_config,
             env,
             t,
+            architecture=architecture,
+            layers=layers,
+        )
+
+
+def publish_layer(
+    layer_name,
+    layer_archive,
+    runtime,
+    architecture=None,
+    s3_bucket=None,
+    s3_multipart_chunksize=DEFAULT_MULTIPART_CHUNKSIZE,
+    s3_max_concurrency=DEFAULT_MAX_CONCURRENCY,
+):
+    '''
+    Publishes `layer_archive` as a new version of the layer `layer_name`, unless its latest
+    version already holds the same content.  The SHA-256 of the archive is kept in the
+    description of each version to tell.  Archives too large to send inline are uploaded
+    to `s3_bucket` first, keyed by their hash under the layer's name.
+
+    :return: ARN of the layer version holding the archive.
+    '''
+    lambda_client = get_client('lambda')
+    digest = archive_sha256(layer_archive)
+    description = LAYER_DESCRIPTION % digest
+
+    response = lambda_client.list_layer_versions(LayerName=layer_name, MaxItems=1)
+    for latest in response.get('LayerVersions', []):
+        if latest.get('Description') == description and (
+            not architecture or architecture in latest.get('CompatibleArchitectures', [])
+        ):
+            info('Layer [%s] is unchanged, using [%s]' % (layer_name, latest['LayerVersionArn']))
+            return latest['LayerVersionArn']
+
+    architectures = {}
+    if architecture:
+        architectures = {'CompatibleArchitectures': [architecture]}
+
+    info('Publishing a new version of layer [%s]' % layer_name)
+    with ExitStack() as stack:
+        if stat(layer_archive).st_size < MAX_LAMBDA_SIZE:
+            binaryfile = stack.enter_context(open(layer_archive, 'rb'))
+            content = {
+                'ZipFile': stack.enter_context(mmap(binaryfile.fileno(), 0, access=ACCESS_READ))
+            }
+        else:
+            s3_key = upload_file(
+                s3_bucket,
+                layer_name,
+                layer_archive,
+                True,
+                s3_multipart_chunksize,
+                s3_max_concurrency,
+            )
+            content = {'S3Bucket': s3_bucket, 'S3Key': s3_key}
+        response = lambda_client.publish_layer_version(
+            LayerName=layer_name,
+            Description=description,
+            Content=content,
+            CompatibleRuntimes=[runtime],
+            **architectures,
+        )
+    info('Published version [%s] of layer [%s]' % (response['Version'], layer_name))
+    return response['LayerVersionArn']
+
+
+def archive_sha256(archive):
+    '''
+    Hashes the given archive in chunks, returning the base64-encoded SHA-256 digest in the
+    same form as the `CodeSha256` that Lambda reports for deployed code.
+    '''
+    return b64encode(file_sha256(archive).digest()).decode('ascii')
+
+
+def is_code_unchanged(archive, lambda_name, architecture=None):
+    '''
+    Returns True when a function named `lambda_name` is already deployed with exactly the
+    code contained in `archive`, for the given `architecture` if any.
+    '''
+    lambda_client = get_client('lambda')
+    existing = lookup_function(lambda_client, lambda_name)
+    if not existing:
+        return False
+
+    deployed_architectures = existing['Configuration'].get('Architectures', ['x86_64'])
+    if architecture and architecture not in deployed_architectures:
+        debug(
+            'Deployed architectures: %s, requested: [%s]' % (deployed_architectures, architecture)
         )
+        return False
+
+    deployed_sha256 = existing['Configuration'].get('CodeSha256')
+    local_sha256 = archive_sha256(archive)
+    debug('Local CodeSha256: [%s], deployed CodeSha256: [%s]' % (local_sha256, deployed_sha256))
+    return local_sha256 == deployed_sha256
+
+
+def resolve_architecture(archive, architecture=None):
+    '''
+    Returns the architecture to deploy `archive` to: the requested `architecture` if given,
+    otherwise the one its native code was built for, or None if it has no native code.
+
+    :raises ValueError: if the native code in the archive cannot run on `architecture`.
+    '''
+    detected = detect_architecture(archive)
+    if architecture and detected and architecture != detected:
+        raise ValueError(
+            'Archive [%s] contains native code built for [%s], refusing to deploy it as [%s].'
+            % (archive, detected, architecture)
+        )
+    if detected and not architecture:
+        info('Detected architecture [%s] from native code in [%s]' % (detected, archive))
+    return architecture or detected
+
+
+def detect_architecture(archive):
+    '''
+    Detects the architecture of the shared objects in a zip archive by reading the ELF
+    header of each `.so` file listed in its central directory.
+
+    :return: 'x86_64', 'arm64', or None if the archive holds no native code.
+    :raises ValueError: if the archive holds native code for more than one architecture.
+    '''
+    found = {}
+    with ZipFile(archive) as zf:
+        for zinfo in zf.infolist():
+            name = path.basename(zinfo.filename)
+            if not (name.endswith('.so') or '.so.' in name) or zinfo.is_dir():
+                continue
+            with zf.open(zinfo) as so:
+                header = so.read(ELF_HEADER_SIZE)
+            if len(header) < ELF_HEADER_SIZE or header[:4] != ELF_MAGIC:
+                continue
+            byteorder = 'little' if header[5] == 1 else 'big'
+            machine = int.from_bytes(header[18:20], byteorder)
+            architecture = ELF_MACHINES.get(machine)
+            if architecture:
+                found.setdefault(architecture, zinfo.filename)
+
+    if len(found) > 1:
+        raise ValueError(
+            'Archive [%s] mixes native code for several architectures: %s'
+            % (archive, ', '.join('%s (%s)' % item for item in sorted(found.items())))
+        )
+    return next(iter(found), None)
 
 
 def deploy_function_from_s3(
@@ -91,6 +306,8 @@ def deploy_function_from_s3(
     vpc_config=None,
     environment=None,
     tags=None,
+    architecture=None,
+    layers=None,
 ):
     code = {'S3Bucket': s3_bucket, 'S3Key': s3_key}
     return create_or_replace_function(
@@ -105,6 +322,8 @@ def deploy_function_from_s3(
         vpc_config,
         environment,
         tags,
+        architecture,
+        layers,
     )
 
 
@@ -120,9 +339,18 @@ def deploy_function_from_zip(
     vpc_config=None,
     environment=None,
     tags=None,
+    architecture=None,
+    layers=None,
 ):
-    with open(archive, 'rb') as binaryfile:
-        zipfile = bytearray(binaryfile.read())
+    '''
+    Deploys the function with the contents of `archive` sent inline with the request.  The
+    archive is memory-mapped rather than read into memory, so that it is not copied before
+    botocore encodes it.
+    '''
+    with (
+        open(archive, 'rb') as binaryfile,
+        mmap(binaryfile.fileno(), 0, access=ACCESS_READ) as zipfile,
+    ):
         code = {'ZipFile': zipfile}
         return create_or_replace_function(
             lambda_name,
@@ -136,6 +364,8 @@ def deploy_function_from_zip(
             vpc_config,
             environment,
             tags,
+            architecture,
+            layers,
         )
 
 
@@ -151,13 +381,17 @@ def create_or_replace_function(
     vpc_config=None,
     environment=None,
     tags=None,
+    architecture=None,
+    layers=None,
 ):
     '''
     Deploys a lambda function to AWS Lambda.  If a function already exists under the given
-    `lambda_name` then this will delete it.
+    `lambda_name` then its code and configuration are updated in place and a new version
+    is published, so that the function stays available throughout the deploy.
 
     :param lambda_name: Name for the Lambda function
-    :param code: Config for location of executable code for the function.
+    :param code: Config for location of executable code for the function.  If None, the
+                 function must already exist and only its configuration is updated.
     :param handler_name: Name of the entry point of the function.
     :param execution_role: Name of a role with execute permissions.
     :param vpc_config: Optional VPC config where the function should execute.
@@ -165,12 +399,17 @@ def create_or_replace_function(
     :param runtime: Language runtime of the function. Default: python3.7
     :param environment: Environment variables to be available at runtime to the function.
     :param tags: Tags to identify the function.
+    :param architecture: Instruction set of the function, 'x86_64' or 'arm64'.  If None,
+                         Lambda's default is used for new functions and existing functions
+                         keep theirs.
+    :param layers: ARNs of the layer versions to attach to the function.  An existing
+                   function keeps its other layers, with any versions of the same layers
+                   replaced, see `merge_layers`.  If None, new functions get no layers and
+                   existing functions keep theirs.
     :return: ARN of deployed function.
     '''
 
-    delete_function(lambda_name)
-
-    lambda_client = boto3.client('lambda')
+    lambda_client = get_client('lambda')
 
     env = {}
     if environment:
@@ -178,6 +417,40 @@ def create_or_replace_function(
 
     tracing_config = {'Mode': 'PassThrough'}
 
+    architectures = {}
+    if architecture:
+        architectures = {'Architectures': [architecture]}
+
+    layer_config = {}
+    if layers is not None:
+        layer_config = {'Layers': layers}
+
+    existing = lookup_function(lambda_client, lambda_name)
+    if existing:
+        if layers is not None:
+            attached = [layer['Arn'] for layer in existing['Configuration'].get('Layers', [])]
+            layer_config = {'Layers': merge_layers(attached, layers)}
+        return update_function(
+            lambda_client,
+            existing,
+            code,
+            handler_name,
+            execution_role,
+            connection_timeout,
+            memory_size,
+            runtime,
+            description,
+            vpc_config,
+            env,
+            tracing_config,
+            tags,
+            architectures,
+            layer_config,
+        )
+
+    if code is None:
+        raise ValueError('No code given to create lambda [%s] from.' % lambda_name)
+
     info('Creating a lambda function with name: [%s]' % lambda_name)
     response = lambda_client.create_function(
         FunctionName=lambda_name,
@@ -193,11 +466,107 @@ def create_or_replace_function(
         Environment=env,
         TracingConfig=tracing_config,
         Tags=tags,
+        **architectures,
+        **layer_config,
     )
 
     return response['FunctionArn']
 
 
+def update_function(
+    lambda_client,
+    existing,
+    code,
+    handler_name,
+    execution_role,
+    connection_timeout,
+    memory_size,
+    runtime,
+    description,
+    vpc_config,
+    environment,
+    tracing_config,
+    tags,
+    architectures=None,
+    layer_config=None,
+):
+    '''
+    Updates the code and configuration of an existing function in place, waiting for each
+    update to settle before the next one, and then publishes a new version.
+
+    :param existing: Response of `get_function` for the function being updated.
+    :param code: Config for location of the new code, or None to leave the code as is.
+    :param architectures: `Architectures` argument to send along with the new code, if any.
+    :param layer_config: `Layers` argument to send along with the configuration, if any.
+    :return: ARN of the function, without the version, as `create_function` returns it.
+    '''
+    configuration = existing['Configuration']
+    lambda_name = configuration['FunctionName']
+    waiter = lambda_client.get_waiter('function_updated')
+
+    if code:
+        info('Updating code of existing lambda function: [%s]' % lambda_name)
+        lambda_client.update_function_code(
+            FunctionName=lambda_name, **code, **(architectures or {})
+        )
+        waiter.wait(FunctionName=lambda_name)
+
+    info('Updating configuration of existing lambda function: [%s]' % lambda_name)
+    lambda_client.update_function_configuration(
+        FunctionName=lambda_name,
+        Runtime=runtime,
+        Role=execution_role,
+        Handler=handler_name,
+        Description=description or '',
+        Timeout=int(connection_timeout),
+        MemorySize=int(memory_size),
+        VpcConfig=vpc_config or {'SubnetIds': [], 'SecurityGroupIds': []},
+        Environment=environment or {'Variables': {}},
+        TracingConfig=tracing_config,
+        **(layer_config or {}),
+    )
+    waiter.wait(FunctionName=lambda_name)
+
+    if tags:
+        lambda_client.tag_resource(Resource=configuration['FunctionArn'], Tags=tags)
+
+    response = lambda_client.publish_version(FunctionName=lambda_name)
+    info('Published version [%s] of lambda [%s]' % (response['Version'], lambda_name))
+
+    return configuration['FunctionArn']
+
+
+def merge_layers(attached, layers):
+    '''
+    Returns the layer version ARNs `attached` to a function with the versions of the same
+    layers as `layers` replaced by those, so that layers attached by other means are kept
+    in place.  Layers not attached yet are added after them.
+    '''
+    replacements = {layer_arn(arn): arn for arn in layers}
+    merged = [replacements.pop(layer_arn(arn), arn) for arn in attached]
+    return merged + list(replacements.values())
+
+
+def layer_arn(layer_version_arn):
+    '''
+    Returns the ARN of the layer of a layer version ARN, without its version.
+    '''
+    return layer_version_arn.rsplit(':', 1)[0]
+
+
+def lookup_function(lambda_client, lambda_name):
+    '''
+    Looks up a lambda function by name or ARN.
+
+    :return: Response of `get_function`, or None if no such function exists.
+    '''
+    try:
+        return lambda_client.get_function(FunctionName=lambda_name)
+    except lambda_client.exceptions.ResourceNotFoundException:
+        debug('No lambda named [%s] found.' % lambda_name)
+        return None
+
+
 def delete_function(lambda_name):
     '''
     Deletes a lambda function.
@@ -205,63 +574,164 @@ def delete_function(lambda_name):
     :param lambda_name: Name or ARN of the Lambda function to be deleted.
     :return: None
     '''
-    lambda_client = boto3.client('lambda')
-    response = lambda_client.list_functions()
-    for f in response['Functions']:
-        if f['FunctionName'] == lambda_name:
-            debug('Found existing function [%s].' % f['FunctionName'])
-            lambda_client.delete_function(FunctionName=lambda_name)
-            info('Existing function [%s] deleted.' % f['FunctionName'])
-            return
-    info('No lambda named [%s] found to delete.' % lambda_name)
+    lambda_client = get_client('lambda')
+    try:
+        lambda_client.delete_function(FunctionName=lambda_name)
+    except lambda_client.exceptions.ResourceNotFoundException:
+        info('No lambda named [%s] found to delete.' % lambda_name)
+        return
+    info('Existing function [%s] deleted.' % lambda_name)
 
 
-def invoke_function(lambda_name, payload):
+def invoke_function(lambda_name, payload=None, invocation_type='RequestResponse'):
     '''
     Invokes a lambda function.
 
     :param lambda_name: Name or ARN of the Lambda function to invoke.
-    :param payload: File of JSON to send along with invocation.
-    :return: None
+    :param payload: Optional file of JSON to send along with invocation.  The file is
+                    streamed as the request body rather than read into memory.
+    :param invocation_type: 'RequestResponse', 'Event' to queue the invocation without
+                            waiting for it, or 'DryRun'.
+    :return: Response of `invoke`, whose `Payload` is a stream.
     '''
-    log_type = 'Tail'
-    invocation_type = 'RequestResponse'  # or 'Event', or 'DryRun'
+    lambda_client = get_client('lambda')
 
-    with open(payload, 'r') as file:
-        input_payload = bytearray(file)
+    params = {'FunctionName': lambda_name, 'InvocationType': invocation_type}
+    if invocation_type == 'RequestResponse':
+        params['LogType'] = 'Tail'
 
-        lambda_client = boto3.client('lambda')
+    if not payload:
+        return lambda_client.invoke(**params)
 
-        res = lambda_client.invoke(
-            FunctionName=lambda_name,
-            InvocationType=invocation_type,
-            LogType=log_type,
-            Payload=input_payload,
-        )
+    with open(payload, 'rb') as file:
+        return lambda_client.invoke(Payload=file, **params)
 
-    return res
 
-
-def invoke_function(lambda_name):
+def invoke_function_stream(lambda_name, out, payload=None, invocation_type='RequestResponse'):
     '''
-    Invokes a lambda function.
+    Invokes a lambda function with response streaming, writing each chunk of the response
+    to `out` as it arrives.
 
     :param lambda_name: Name or ARN of the Lambda function to invoke.
-    :return: None
+    :param out: Binary file-like object that the response is written to.
+    :param payload: Optional file of JSON to stream along with invocation.
+    :param invocation_type: 'RequestResponse', or 'DryRun' to only validate the call, which
+                            then has no response stream.  A streamed invocation cannot be
+                            queued as an 'Event'.
+    :return: The `InvokeComplete` event that ends the response stream, empty if there is
+             none.
+    '''
+    lambda_client = get_client('lambda')
+
+    params = {'FunctionName': lambda_name, 'InvocationType': invocation_type, 'LogType': 'Tail'}
+    if payload:
+        with open(payload, 'rb') as file:
+            response = lambda_client.invoke_with_response_stream(Payload=file, **params)
+    else:
+        response = lambda_client.invoke_with_response_stream(**params)
+
+    complete = {}
+    for event in response.get('EventStream', []):
+        if 'PayloadChunk' in event:
+            out.write(event['PayloadChunk']['Payload'])
+            out.flush()
+        if 'InvokeComplete' in event:
+            complete = event['InvokeComplete']
+    return complete
+
+
+def read_payloads(source):
+    '''
+    Reads invocation payloads from `source`, which is either a file with one JSON document
+    per line, or a directory whose `*.json` files each hold one payload.
+
+    :return: List of payloads, as encoded JSON bytes.
+    '''
+    if path.isdir(source):
+        payloads = []
+        for name in sorted(listdir(source)):
+            if name.endswith('.json'):
+                with open(path.join(source, name), 'rb') as file:
+                    payloads.append(file.read())
+        return payloads
+
+    with open(source, 'rb') as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def invoke_batch(
+    lambda_name,
+    payloads,
+    concurrency=DEFAULT_BATCH_CONCURRENCY,
+    invocation_type='RequestResponse',
+):
     '''
-    log_type = 'Tail'
-    invocation_type = 'RequestResponse'  # or 'Event', or 'DryRun'
+    Invokes a lambda function once per payload, fanning the invocations out over a bounded
+    pool of threads that share a single client.
 
-    lambda_client = boto3.client('lambda')
-    res = lambda_client.invoke(
-        FunctionName=lambda_name, InvocationType=invocation_type, LogType=log_type
+    :param lambda_name: Name or ARN of the Lambda function to invoke.
+    :param payloads: Payloads to invoke the function with, as encoded JSON.
+    :param concurrency: Maximum number of invocations in flight at once.
+    :param invocation_type: 'RequestResponse', or 'Event' to submit the invocations
+                            without waiting for them to run.
+    :return: Summary of the batch, as returned by `summarize_invocations`.
+    '''
+    concurrency = int(concurrency)
+    lambda_client = get_client('lambda', max_pool_connections=concurrency)
+
+    def invoke(index, payload):
+        result = {'index': index}
+        started = perf_counter()
+        try:
+            response = lambda_client.invoke(
+                FunctionName=lambda_name, InvocationType=invocation_type, Payload=payload
+            )
+            response['Payload'].read()
+            result['status'] = response['StatusCode']
+            if response.get('FunctionError'):
+                result['error'] = response['FunctionError']
+        except (BotoCoreError, ClientError) as e:
+            result['error'] = str(e)
+        result['latency_ms'] = (perf_counter() - started) * 1000
+        return result
+
+    info(
+        'Invoking lambda [%s] with [%d] payloads, [%d] at a time.'
+        % (lambda_name, len(payloads), concurrency)
     )
+    started = perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(invoke, range(len(payloads)), payloads))
+    elapsed = perf_counter() - started
+
+    return summarize_invocations(results, elapsed)
+
+
+def summarize_invocations(results, elapsed):
+    '''
+    Summarizes the latency, throughput and error count of a batch of invocations that took
+    `elapsed` seconds.
+    '''
+    latencies = sorted(r['latency_ms'] for r in results)
+    errors = sum(1 for r in results if 'error' in r)
+
+    def percentile(p):
+        if not latencies:
+            return None
+        return latencies[max(ceil(p / 100 * len(latencies)) - 1, 0)]
 
-    return res
+    return {
+        'invocations': len(results),
+        'errors': errors,
+        'elapsed_s': elapsed,
+        'throughput_per_s': len(results) / elapsed if elapsed else None,
+        'latency_ms': {'p50': percentile(50), 'p95': percentile(95), 'p99': percentile(99)},
+        'results': results,
+    }
 
 
 def get_lambda_info(lambda_name):
-    lambda_client = boto3.client('lambda')
+    lambda_client = get_client('lambda')
     response = lambda_client.get_function(FunctionName=lambda_name)
     lambda_arn = response['Configuration']['FunctionArn']
 
@@ -282,7 +752,7 @@ def grant_permission_to_api_resource(api_id, region, account_id, lambda_arn, res
     Grant invoke permissions on the Lambda function so it can be called by API Gateway.
     If it exists already then remove so it can be recreated.
     '''
-    lambda_client = boto3.client('lambda')
+    lambda_client = get_client('lambda')
     lambda_name = lambda_arn.split(':')[6]
     statement_id = f'{lambda_name}-invoke'
     action = 'lambda:InvokeFunction'
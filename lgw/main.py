@@ -1,22 +1,25 @@
 from os import path, makedirs
-from sys import argv
+from sys import argv, stdout
+from contextlib import nullcontext
+from functools import partial
 import json
-from logging import info, debug, error
-from everett.manager import ConfigManager, ConfigOSEnv, ConfigDictEnv
-from dotenv import dotenv_values, find_dotenv
+from logging import info, debug, warning, error
 
 from lgw import parse_args
 
 from lgw.util import configure_logging
+from lgw.clients import configure_clients
+from lgw.api_index import configure_api_index
 from lgw import settings
-from lgw.api_gateway import create_rest_api, delete_rest_api
-from lgw.api_gateway_domain import add_domain_mapping, remove_domain_mapping
-from lgw.lambda_util import deploy_function, invoke_function, delete_function
-from lgw.lambda_bundle import build_lambda_archive
 from lgw.settings import dump
 
+# Each handler imports the modules it needs itself, so that a subcommand only pays for
+# importing the SDKs (boto3, docker, tld) that it actually uses.
+
+
+def handle_deploy_lambda(config, file=None, layer_file=None):
+    from lgw.lambda_util import deploy_function
 
-def handle_deploy_lambda(config, file=None):
     if file:
         info(f'handle_deploy_lambda() called with file [{file}]')
     else:
@@ -32,6 +35,9 @@ def handle_deploy_lambda(config, file=None):
         if not file.endswith('.zip'):
             raise FileNotFoundError('ERROR: Lambda file expected to be in ZIP format.')
 
+    if layer_file and not path.isfile(layer_file):
+        raise FileNotFoundError('ERROR: Layer zip file not found at location: [%s]' % layer_file)
+
     lambda_arn = deploy_function(
         file,
         config('aws_lambda_name'),
@@ -47,13 +53,22 @@ def handle_deploy_lambda(config, file=None):
         config('aws_lambda_vpc_security_groups'),
         config('aws_lambda_environment'),
         config('aws_lambda_tags'),
+        config('aws_lambda_archive_content_addressed', parser=bool),
+        config('aws_lambda_archive_multipart_chunksize', parser=int),
+        config('aws_lambda_archive_max_concurrency', parser=int),
+        config('aws_lambda_architecture') or None,
+        layer_file,
+        config('aws_lambda_layer_name') or f'{config("aws_lambda_name")}-dependencies',
     )
     print(lambda_arn)
     info('Lambda [%s] created.' % config('aws_lambda_name'))
     return 1
 
 
-def handle_lambda_archive(config):
+def handle_lambda_archive(config, watch=False, deploy=False, analyze=False):
+    from concurrent.futures import ThreadPoolExecutor
+    from lgw.lambda_bundle import archive_excludes, target_archive_name, layer_archive_name
+
     info('handle_lambda_archive() called.')
     addl_files = []
     if config('aws_lambda_archive_addl_files'):
@@ -80,33 +95,217 @@ def handle_lambda_archive(config):
     if not path.exists(bundle_dir):
         makedirs(bundle_dir)
 
-    path_to_archive = build_lambda_archive(
-        context_dir, bundle_dir, config('aws_lambda_archive_bundle_name'), addl_files, addl_packages
-    )
-    print(path_to_archive)
-    info(f'lambda archive location: [{path_to_archive}]')
+    bundle_name = config('aws_lambda_archive_bundle_name')
+    compresslevel = config('aws_lambda_archive_compression_level', parser=int)
+    pip_cache_dir = config('aws_lambda_archive_pip_cache_dir') or None
+    wheelhouse = config('aws_lambda_archive_wheelhouse') or None
+    prune = []
+    if config('aws_lambda_archive_prune'):
+        prune = config('aws_lambda_archive_prune').split(',')
+    botocore_services = []
+    if config('aws_lambda_archive_botocore_services'):
+        botocore_services = config('aws_lambda_archive_botocore_services').split(',')
+    bytecode = config('aws_lambda_archive_bytecode') or None
+    excludes = archive_excludes(prune, botocore_services, bytecode)
+    strip_symbols = 'strip' in prune
+    python_version = config('aws_lambda_archive_python_version')
+    layer = config('aws_lambda_archive_layer', parser=bool)
+    build_report = config('aws_lambda_archive_build_report') or None
+    architectures = config('aws_lambda_archive_architectures').split(',')
+    if watch and len(architectures) > 1:
+        raise ValueError('--watch updates the archive of a single architecture.')
+
+    def build(architecture):
+        name = bundle_name
+        report = build_report
+        if len(architectures) > 1:
+            name = target_archive_name(bundle_name, architecture)
+            if report:
+                report = target_archive_name(report, architecture)
+
+        if config('aws_lambda_archive_builder') == 'native':
+            from lgw.native_bundle import (
+                build_native_lambda_archive,
+                SdistRequired,
+                InterpreterMismatch,
+            )
+
+            try:
+                return build_native_lambda_archive(
+                    context_dir,
+                    bundle_dir,
+                    name,
+                    addl_files,
+                    compresslevel,
+                    pip_cache_dir,
+                    wheelhouse,
+                    excludes,
+                    strip_symbols,
+                    bytecode,
+                    python_version,
+                    architecture,
+                    layer,
+                )
+            except SdistRequired as e:
+                warning(f'Falling back to a Docker build, a requirement must be compiled: {e}')
+            except InterpreterMismatch as e:
+                warning(f'Falling back to a Docker build to compile bytecode: {e}')
+
+        from lgw.lambda_bundle import build_lambda_archive
+
+        return build_lambda_archive(
+            context_dir,
+            bundle_dir,
+            name,
+            addl_files,
+            addl_packages,
+            compresslevel,
+            pip_cache_dir,
+            wheelhouse,
+            excludes,
+            strip_symbols,
+            bytecode,
+            python_version,
+            architecture,
+            layer,
+            report,
+        )
+
+    # Several architectures are built concurrently, as most of a build is spent waiting on
+    # Docker or pip; a single one is built on this thread.
+    if len(architectures) == 1:
+        archives = {architectures[0]: build(architectures[0])}
+    else:
+        with ThreadPoolExecutor(max_workers=len(architectures)) as executor:
+            archives = dict(zip(architectures, executor.map(build, architectures)))
+
+    layers = {}
+    if layer:
+        layers = {
+            architecture: path.join(
+                path.dirname(location), layer_archive_name(path.basename(location))
+            )
+            for architecture, location in archives.items()
+        }
+
+    for path_to_archive in [*archives.values(), *layers.values()]:
+        print(path_to_archive)
+        info(f'lambda archive location: [{path_to_archive}]')
+
+    if analyze:
+        from lgw.analyze import analyze_archive, format_report
+
+        for path_to_archive in [*archives.values(), *layers.values()]:
+            print(format_report(analyze_archive(path_to_archive)))
+
+    # The archive deployed is the one of the lambda's configured architecture, if it was
+    # built, or else the first one.
+    deployed = config('aws_lambda_architecture')
+    if deployed not in archives:
+        deployed = architectures[0]
+    path_to_archive = archives[deployed]
+    on_update = None
+    if deploy:
+        on_update = partial(handle_deploy_lambda, config, layer_file=layers.get(deployed))
+        on_update(path_to_archive)
+
+    if watch:
+        from lgw.watch import watch_lambda_archive
+
+        watch_lambda_archive(
+            context_dir,
+            path_to_archive,
+            addl_files,
+            compresslevel,
+            on_update,
+            config('aws_lambda_archive_watch_interval', parser=float),
+            excludes,
+            python_version,
+        )
 
 
-def handle_invoke_lambda(name, payload):
+def handle_invoke_lambda(
+    name, payload, invocation_type='RequestResponse', stream=False, output=None
+):
+    from lgw.lambda_util import invoke_function, invoke_function_stream
+
     info('handle_invoke_lambda() called for lambda [%s]' % name)
-    if payload:
-        result = invoke_function(name, payload)
+    if stream and invocation_type != 'RequestResponse':
+        raise ValueError(f'--stream cannot be used with --invocation-type {invocation_type}.')
+    if output:
+        sink = open(output, 'wb')
     else:
-        result = invoke_function(name)
-    json_result = json.loads(result['Payload'].read().decode('utf-8'))
-    print(json_result)
-    info('Invocation completed for lambda [%s]' % name)
+        sink = nullcontext(stdout.buffer)
+
+    with sink as out:
+        if stream:
+            result = invoke_function_stream(name, out, payload, invocation_type)
+            function_error = result.get('ErrorCode')
+        else:
+            result = invoke_function(name, payload, invocation_type)
+            function_error = result.get('FunctionError')
+            for chunk in result['Payload'].iter_chunks():
+                out.write(chunk)
+        if not output:
+            out.write(b'\n')
+
+    if function_error:
+        error('Invocation of lambda [%s] failed: [%s]' % (name, function_error))
+    elif invocation_type == 'Event':
+        info('Invocation queued for lambda [%s]' % name)
+    else:
+        info('Invocation completed for lambda [%s]' % name)
+    return 1
+
+
+def handle_invoke_lambda_batch(
+    name, batch, concurrency, repeat, output, invocation_type='RequestResponse'
+):
+    from lgw.lambda_util import read_payloads, invoke_batch
+
+    info('handle_invoke_lambda_batch() called for lambda [%s] with [%s]' % (name, batch))
+    payloads = read_payloads(batch) * repeat
+    summary = invoke_batch(name, payloads, concurrency, invocation_type)
+
+    if output:
+        with open(output, 'w') as file:
+            json.dump(summary, file, indent=2)
+        info('Batch results written to [%s]' % output)
+
+    latency = summary['latency_ms']
+    print(
+        'invocations: %d, errors: %d, throughput: %.1f/s, p50: %.1fms, p95: %.1fms, p99: %.1fms'
+        % (
+            summary['invocations'],
+            summary['errors'],
+            summary['throughput_per_s'] or 0,
+            latency['p50'] or 0,
+            latency['p95'] or 0,
+            latency['p99'] or 0,
+        )
+    )
+    info('Batch invocation completed for lambda [%s]' % name)
     return 1
 
 
 def handle_delete_lambda(name):
+    from lgw.lambda_util import delete_function
+
     info('handle_delete_lambda() called for lambda [%s]' % name)
     delete_function(name)
     info('Lambda [%s] deleted.' % name)
     return 1
 
 
-def handle_deploy_api_gateway(config):
+def handle_deploy_api_gateway(config, plan=False):
+    from lgw.api_gateway import (
+        create_rest_api,
+        plan_rest_api,
+        format_plan,
+        import_rest_api,
+        render_rest_api,
+    )
+
     binary_types = []
     if config('aws_api_binary_types'):
         binary_types = config('aws_api_binary_types').split(',')
@@ -117,7 +316,7 @@ def handle_deploy_api_gateway(config):
             item.split('=') for item in config('aws_api_response_models').split(';')
         )
 
-    api_url = create_rest_api(
+    api_args = (
         config('aws_api_name'),
         config('aws_api_description'),
         binary_types,
@@ -127,18 +326,46 @@ def handle_deploy_api_gateway(config):
         config('aws_api_lambda_integration_role'),
         response_models,
     )
+    deploy_mode = config('aws_api_deploy_mode')
+    if deploy_mode not in ('incremental', 'openapi'):
+        raise ValueError(f'Unknown API deploy mode: {deploy_mode}')
+
+    if plan and deploy_mode == 'openapi':
+        document = render_rest_api(
+            config('aws_api_name'),
+            config('aws_api_description'),
+            binary_types,
+            config('aws_lambda_name'),
+            config('aws_api_resource_path'),
+            config('aws_api_lambda_integration_role'),
+            response_models,
+        )
+        print(json.dumps(document, indent=2))
+        return 1
+    if plan:
+        print(format_plan(plan_rest_api(*api_args)))
+        return 1
+
+    if deploy_mode == 'openapi':
+        api_url = import_rest_api(*api_args)
+    else:
+        api_url = create_rest_api(*api_args)
     print(api_url)
     info('REST API URL: [%s]' % api_url)
     return 1
 
 
 def handle_undeploy_api_gateway(config):
+    from lgw.api_gateway import delete_rest_api
+
     delete_rest_api(config('aws_api_name'))
     info('API Gateway %s deleted.' % config('aws_api_name'))
     return 1
 
 
 def handle_add_domain(config):
+    from lgw.api_gateway_domain import add_domain_mapping
+
     api_name = config('aws_api_name')
     domain_name = config('aws_api_domain_name')
     base_path = config('aws_api_base_path')
@@ -156,6 +383,8 @@ def handle_add_domain(config):
 
 
 def handle_remove_domain(config):
+    from lgw.api_gateway_domain import remove_domain_mapping
+
     api_name = config('aws_api_name')
     domain_name = config('aws_api_domain_name')
     base_path = config('aws_api_base_path')
@@ -173,6 +402,8 @@ def app(args, config):
         raise ValueError('No command provided.')
 
     if command == 'gw-deploy':
+        if args.get('plan'):
+            return handle_deploy_api_gateway(config, plan=True)
         return handle_deploy_api_gateway(config)
     if command == 'gw-undeploy':
         return handle_undeploy_api_gateway(config)
@@ -182,6 +413,10 @@ def app(args, config):
         return handle_remove_domain(config)
     if command == 'lambda-deploy':
         file_arg = args.get('lambda_file')
+        layer_arg = args.get('layer_file')
+        if layer_arg:
+            file = path.abspath(file_arg) if file_arg else None
+            return handle_deploy_lambda(config, file, path.abspath(layer_arg))
         if file_arg:
             file = path.abspath(file_arg)
             return handle_deploy_lambda(config, file)
@@ -189,18 +424,43 @@ def app(args, config):
             return handle_deploy_lambda(config)
     if command == 'lambda-invoke':
         name = args.get('lambda_name')
+        batch = args.get('batch')
+        if batch:
+            return handle_invoke_lambda_batch(
+                name,
+                batch,
+                args.get('concurrency', 10),
+                args.get('repeat', 1),
+                args.get('output'),
+                args.get('invocation_type', 'RequestResponse'),
+            )
         payload = args.get('payload', None)
-        return handle_invoke_lambda(name, payload)
+        return handle_invoke_lambda(
+            name,
+            payload,
+            args.get('invocation_type', 'RequestResponse'),
+            args.get('stream', False),
+            args.get('output'),
+        )
     if command == 'lambda-delete':
         name = args.get('lambda_name')
         return handle_delete_lambda(name)
     if command == 'lambda-archive':
-        return handle_lambda_archive(config)
+        watch = args.get('watch', False)
+        deploy = args.get('deploy', False)
+        analyze = args.get('analyze', False)
+        if watch or deploy or analyze:
+            return handle_lambda_archive(config, watch, deploy, analyze)
+        else:
+            return handle_lambda_archive(config)
 
     error(f'Unrecognized command: {command}')
 
 
 def load_config(config_file):
+    from everett.manager import ConfigManager, ConfigOSEnv, ConfigDictEnv
+    from dotenv import dotenv_values, find_dotenv
+
     # python-dotenv enables interpolation of values in config file
     # from the environment or elsewhere in the config file using
     # POSIX variable expansion
@@ -236,6 +496,15 @@ def main():
         debug('All config values:')
         dump(config)
 
+    configure_clients(
+        max_pool_connections=config('aws_client_max_pool_connections', parser=int),
+        retry_mode=config('aws_client_retry_mode'),
+        max_attempts=config('aws_client_max_attempts', parser=int),
+        connect_timeout=config('aws_client_connect_timeout', parser=int),
+        read_timeout=config('aws_client_read_timeout', parser=int),
+    )
+    configure_api_index(config('aws_api_index_cache_file'), config('aws_api_index_ttl', parser=int))
+
     app(args, config)
 
 
@@ -0,0 +1,232 @@
+import os
+import sys
+import re
+import shutil
+import posixpath
+import subprocess
+import tempfile
+from itertools import chain
+
+from logging import debug, info, warning
+
+from lgw.lambda_bundle import (
+    PYTHON_VERSION,
+    DEFAULT_ARCHITECTURE,
+    ZIP_EXCLUDES,
+    layer_archive_name,
+    read_dockerignore,
+    walk_context,
+    is_ignored,
+)
+from lgw.archiver import (
+    write_archive,
+    tree_entries,
+    compile_tree,
+    DEFAULT_COMPRESSION_LEVEL,
+    LAYER_PREFIX,
+)
+
+MANYLINUX_TAGS = ['manylinux_2_34', 'manylinux_2_28', 'manylinux_2_17', 'manylinux2014']
+SHARED_LIBRARY = re.compile(r'\.so(\.[0-9.]+)?$')
+ARCH_MACHINES = {'arm64': 'aarch64', 'x86_64': 'x86_64'}
+# pip's --target installs console scripts here; the Docker build leaves them in the venv.
+SCRIPTS_DIR = 'bin'
+
+# pip's messages when a requirement is only available as an sdist under --only-binary.
+SDIST_REQUIRED_ERRORS = ['No matching distribution found', 'Could not find a version']
+
+
+class SdistRequired(Exception):
+    '''
+    Raised when a requirement has no wheel for the target platform, so that it would have
+    to be compiled from an sdist.
+    '''
+
+
+class InterpreterMismatch(Exception):
+    '''
+    Raised when bytecode is requested but the running interpreter is not the lambda's
+    Python version, so that it cannot compile for it.
+    '''
+
+
+def build_native_lambda_archive(
+    context_dir,
+    lambda_archive_dir,
+    lambda_archive_filename,
+    addl_project_files=[],
+    compresslevel=DEFAULT_COMPRESSION_LEVEL,
+    pip_cache_dir=None,
+    wheelhouse=None,
+    excludes=ZIP_EXCLUDES,
+    strip_symbols=False,
+    bytecode=None,
+    python_version=PYTHON_VERSION,
+    architecture=DEFAULT_ARCHITECTURE,
+    layer=False,
+):
+    '''
+    Builds a lambda archive without Docker: the requirements are resolved to wheels for the
+    lambda's platform and Python version, unpacked into a staging tree, and zipped along
+    with the project files.
+
+    :param pip_cache_dir: Optional directory for pip's HTTP and wheel caches.
+    :param wheelhouse: Optional directory of pre-fetched wheels, which are then the only
+                       source pip installs from.
+    :param excludes: Patterns of the files left out of the archive.
+    :param strip_symbols: Whether to strip debug symbols from shared libraries.
+    :param bytecode: `pyc` or `pyc-only`, as for the Docker build.  The project files are
+                     then copied to the staging tree to be compiled.
+    :param python_version: Python version of the lambda runtime, e.g. `3.12`.
+    :param architecture: Instruction set of the lambda, `arm64` or `x86_64`.
+    :param layer: Write the dependencies to a separate layer archive, as the Docker build
+                  does.
+
+    :raises SdistRequired: if a requirement has no wheel for the target platform.
+    :raises InterpreterMismatch: if bytecode is requested and this is not the lambda's
+                                 Python version.
+    :return: Location of the archive.
+    '''
+    running_version = '%d.%d' % sys.version_info[:2]
+    if bytecode and running_version != python_version:
+        raise InterpreterMismatch(
+            f'Python {running_version} cannot compile bytecode for Python {python_version}'
+        )
+
+    with tempfile.TemporaryDirectory() as staging:
+        site_packages = os.path.join(staging, 'site-packages')
+        install_wheels(
+            os.path.join(context_dir, 'requirements.txt'),
+            site_packages,
+            pip_cache_dir,
+            wheelhouse,
+            python_version,
+            architecture,
+        )
+        shutil.rmtree(os.path.join(site_packages, SCRIPTS_DIR), ignore_errors=True)
+        if strip_symbols:
+            strip_debug_symbols(site_packages)
+
+        project = project_entries(context_dir, addl_project_files)
+        if bytecode:
+            project_dir = os.path.join(staging, 'project')
+            stage_entries(project, project_dir)
+            info(f'Compiling bytecode for Python {python_version}')
+            compile_tree(project_dir)
+            compile_tree(site_packages, sourceless=bytecode == 'pyc-only')
+            project = tree_entries(project_dir)
+
+        dependencies = tree_entries(site_packages)
+        if layer:
+            layer_location = os.path.join(
+                lambda_archive_dir, layer_archive_name(lambda_archive_filename)
+            )
+            info(f'Writing layer archive to {layer_location}')
+            count = write_archive(
+                layer_location, dependencies, compresslevel, excludes, prefix=LAYER_PREFIX
+            )
+            debug(f'Wrote {count} entries to {layer_location}')
+            dependencies = []
+
+        location = os.path.join(lambda_archive_dir, lambda_archive_filename)
+        info(f'Writing lambda archive to {location}')
+        entries = chain(project, dependencies)
+        count = write_archive(location, entries, compresslevel, excludes)
+        debug(f'Wrote {count} entries to {location}')
+
+    return location
+
+
+def platform_tags(architecture=DEFAULT_ARCHITECTURE):
+    machine = ARCH_MACHINES[architecture]
+    return [f'{tag}_{machine}' for tag in MANYLINUX_TAGS]
+
+
+def install_wheels(
+    requirements,
+    target,
+    pip_cache_dir=None,
+    wheelhouse=None,
+    python_version=PYTHON_VERSION,
+    architecture=DEFAULT_ARCHITECTURE,
+):
+    '''
+    Installs the wheels resolved from `requirements` for the lambda's platform into
+    `target`, refusing to fall back to building sdists.  With a `wheelhouse`, no index is
+    consulted.
+    '''
+    command = [sys.executable, '-m', 'pip', 'install', '--quiet', '--no-compile']
+    command += ['--target', target, '--requirement', requirements]
+    command += ['--only-binary=:all:', '--implementation', 'cp']
+    command += ['--python-version', python_version]
+    for tag in platform_tags(architecture):
+        command += ['--platform', tag]
+    if pip_cache_dir:
+        command += ['--cache-dir', os.path.abspath(pip_cache_dir)]
+    if wheelhouse:
+        command += ['--no-index', '--find-links', os.path.abspath(wheelhouse)]
+
+    info(f'Installing wheels for {", ".join(platform_tags(architecture))}')
+    debug(' '.join(command))
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        if any(e in result.stderr for e in SDIST_REQUIRED_ERRORS):
+            raise SdistRequired(result.stderr.strip())
+        raise subprocess.CalledProcessError(
+            result.returncode, command, result.stdout, result.stderr
+        )
+
+
+def strip_debug_symbols(directory):
+    '''
+    Strips the debug symbols from the shared libraries under `directory` with `strip`.
+    Libraries the host's `strip` cannot handle, such as those of another architecture, are
+    left as they are.
+    '''
+    strip = shutil.which('strip')
+    if not strip:
+        warning('Not stripping shared libraries, strip was not found.')
+        return
+
+    libraries = [s for s, _ in tree_entries(directory) if SHARED_LIBRARY.search(s)]
+    info(f'Stripping debug symbols from {len(libraries)} shared libraries')
+    for library in libraries:
+        result = subprocess.run([strip, '--strip-debug', library], capture_output=True, text=True)
+        if result.returncode != 0:
+            warning(f'Could not strip {library}: {result.stderr.strip()}')
+
+
+def stage_entries(entries, directory):
+    '''
+    Copies the `(source, arcname)` pairs of `entries` under `directory`, keeping the first
+    occurrence of each arcname.
+    '''
+    for source, arcname in entries:
+        target = os.path.join(directory, *arcname.split('/'))
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(source, target)
+
+
+def project_entries(context_dir, addl_project_files):
+    '''
+    Yields `(source, arcname)` for `requirements.txt` and for each `(src, dest)` pair of
+    `addl_project_files`, placed in the archive as the Docker build's `COPY src dest` would
+    place them in the working directory.  As in the Docker build context, files matched by
+    `DEFAULT_DOCKERIGNORE` or the project's `.dockerignore` are left out.
+    '''
+    patterns = read_dockerignore(context_dir)
+    yield os.path.join(context_dir, 'requirements.txt'), 'requirements.txt'
+    for src, dest in addl_project_files:
+        source = os.path.join(context_dir, src)
+        if os.path.isdir(source):
+            for path, _ in walk_context(context_dir, patterns, src):
+                if not os.path.isdir(path):
+                    relpath = os.path.relpath(path, source).replace(os.sep, '/')
+                    yield path, posixpath.normpath(posixpath.join(dest, relpath))
+        elif is_ignored(os.path.relpath(source, context_dir).replace(os.sep, '/'), patterns):
+            debug(f'Skipping {src}, ignored by .dockerignore')
+        elif dest.endswith('/') or dest in ('.', './'):
+            yield source, posixpath.normpath(posixpath.join(dest, os.path.basename(src)))
+        else:
+            yield source, posixpath.normpath(dest)
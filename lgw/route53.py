@@ -1,5 +1,5 @@
 from logging import info, warn
-import boto3
+from lgw.clients import get_client
 from tld import get_fld
 
 
@@ -9,7 +9,7 @@ def update_dns_a_record(domain_name, alias_target_dns_name):
     Assumes that the hosted zone that hosts the domain name is public, and that
     that the domain name is the apex for this hosted zone.
     '''
-    r53_client = boto3.client('route53')
+    r53_client = get_client('route53')
 
     apex_domain = get_fld(domain_name, fix_protocol=True)
 
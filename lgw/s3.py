@@ -1,14 +1,120 @@
+from os import stat
+from os.path import splitext
+from threading import Lock
+from time import monotonic
 from logging import debug, info
-import boto3
-from boto3.s3.transfer import S3Transfer
+from botocore.exceptions import ClientError
+from boto3.s3.transfer import S3Transfer, TransferConfig
+from lgw.clients import get_client
+from lgw.util import file_sha256
 
+MB = 1024 * 1024
+DEFAULT_MULTIPART_CHUNKSIZE = 8 * MB
+DEFAULT_MAX_CONCURRENCY = 10
+SHA256_METADATA_KEY = 'sha256'
+
+
+def upload_file(
+    archive_bucket,
+    artifact_name,
+    file,
+    content_addressed=False,
+    multipart_chunksize=DEFAULT_MULTIPART_CHUNKSIZE,
+    max_concurrency=DEFAULT_MAX_CONCURRENCY,
+):
+    '''
+    Uploads `file` to `archive_bucket`, skipping the upload when an object with the same
+    SHA-256 is already stored under the target key.
+
+    :param artifact_name: Key of the uploaded object.  When `content_addressed` is set this
+                          is used as a prefix, under which the object is keyed by its hash.
+    :param multipart_chunksize: Size in bytes of each part of a multipart upload.
+    :param max_concurrency: Maximum number of parts uploaded in parallel.
+    :return: Key the file is stored under.
+    '''
+    digest = file_sha256(file).hexdigest()
+    if content_addressed:
+        artifact_name = content_addressed_key(artifact_name, file, digest)
+
+    s3 = get_client('s3')
+    if is_uploaded(s3, archive_bucket, artifact_name, digest):
+        info('File [%s] already in bucket [%s], skipping upload.' % (artifact_name, archive_bucket))
+        return artifact_name
 
-def upload_file(archive_bucket, artifact_name, file):
     debug(
         'Uploading artifact [%s] to bucket [%s] using archive [%s]'
         % (artifact_name, archive_bucket, file)
     )
-    s3 = boto3.client('s3')
-    client = S3Transfer(client=s3)
-    client.upload_file(file, archive_bucket, artifact_name)
+    config = TransferConfig(
+        multipart_chunksize=int(multipart_chunksize), max_concurrency=int(max_concurrency)
+    )
+    client = S3Transfer(client=s3, config=config)
+    client.upload_file(
+        file,
+        archive_bucket,
+        artifact_name,
+        callback=UploadProgress(file),
+        extra_args={'Metadata': {SHA256_METADATA_KEY: digest}},
+    )
     info('File [%s] uploaded to bucket [%s]' % (artifact_name, archive_bucket))
+    return artifact_name
+
+
+def content_addressed_key(prefix, file, digest):
+    '''
+    Returns a key under `prefix` derived from the `digest` of `file`, keeping its extension.
+    An empty `prefix` keys the object at the root of the bucket.
+    '''
+    _, extension = splitext(file)
+    key = digest + extension
+    prefix = prefix.rstrip('/')
+    return '%s/%s' % (prefix, key) if prefix else key
+
+
+def is_uploaded(s3, archive_bucket, artifact_name, digest):
+    '''
+    Returns True when the object at `artifact_name` exists and was uploaded with `digest`.
+    '''
+    try:
+        response = s3.head_object(Bucket=archive_bucket, Key=artifact_name)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+    return response.get('Metadata', {}).get(SHA256_METADATA_KEY) == digest
+
+
+class UploadProgress:
+    '''
+    Transfer callback that logs the progress and throughput of an upload.  It is called
+    from the transfer's worker threads.
+    '''
+
+    def __init__(self, file, interval=1.0):
+        self.file = file
+        self.size = stat(file).st_size
+        self.interval = interval
+        self.transferred = 0
+        self.started = monotonic()
+        self.reported = self.started
+        self.lock = Lock()
+
+    def __call__(self, bytes_transferred):
+        with self.lock:
+            self.transferred += bytes_transferred
+            now = monotonic()
+            if now - self.reported < self.interval and self.transferred < self.size:
+                return
+            self.reported = now
+            elapsed = max(now - self.started, 1e-6)
+            percent = 100.0 * self.transferred / self.size if self.size else 100.0
+            info(
+                'Uploaded [%s]: %.1f of %.1f MB (%.0f%%) at %.1f MB/s'
+                % (
+                    self.file,
+                    self.transferred / MB,
+                    self.size / MB,
+                    percent,
+                    self.transferred / MB / elapsed,
+                )
+            )
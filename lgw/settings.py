@@ -1,6 +1,11 @@
 def defaults():
     return {
         'aws_region': 'us-east-1',
+        'aws_client_max_pool_connections': 10,
+        'aws_client_retry_mode': 'standard',
+        'aws_client_max_attempts': 5,
+        'aws_client_connect_timeout': 10,
+        'aws_client_read_timeout': 60,
         'aws_api_name': '',
         'aws_api_description': '',
         'aws_api_resource_path': '{proxy+}',
@@ -11,20 +16,40 @@ def defaults():
         'aws_api_domain_wait_until_available': 'true',
         'aws_api_response_models': 'application/json=Empty',
         'aws_api_binary_types': '',
+        'aws_api_deploy_mode': 'incremental',
+        'aws_api_index_cache_file': '~/.cache/lgw/api-index.json',
+        'aws_api_index_ttl': 3600,
         'aws_acm_certificate_arn': '',
         'aws_lambda_name': '',
         'aws_lambda_description': '',
         'aws_lambda_handler': '',
         'aws_lambda_runtime': 'python3.7',
+        'aws_lambda_architecture': '',
         'aws_lambda_connection_timeout': 30,
         'aws_lambda_memory_size': 3000,
         'aws_lambda_archive_bucket': '',
         'aws_lambda_archive_key': '',
+        'aws_lambda_archive_content_addressed': 'false',
+        'aws_lambda_archive_multipart_chunksize': 8388608,
+        'aws_lambda_archive_max_concurrency': 10,
         'aws_lambda_execution_role_arn': '',
         'aws_lambda_vpc_subnets': '',
         'aws_lambda_vpc_security_groups': '',
         'aws_lambda_environment': '',
         'aws_lambda_tags': '',
+        'aws_lambda_archive_builder': 'docker',
+        'aws_lambda_archive_compression_level': 9,
+        'aws_lambda_archive_pip_cache_dir': '',
+        'aws_lambda_archive_wheelhouse': '',
+        'aws_lambda_archive_watch_interval': 1.0,
+        'aws_lambda_archive_prune': '',
+        'aws_lambda_archive_botocore_services': '',
+        'aws_lambda_archive_bytecode': '',
+        'aws_lambda_archive_python_version': '3.12',
+        'aws_lambda_archive_architectures': 'arm64',
+        'aws_lambda_archive_layer': 'false',
+        'aws_lambda_archive_build_report': '',
+        'aws_lambda_layer_name': '',
         'aws_lambda_archive_context_dir': '.',
         'aws_lambda_archive_bundle_dir': './build',
         'aws_lambda_archive_bundle_name': 'lambda-bundle.zip',
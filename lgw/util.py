@@ -1,5 +1,11 @@
+from hashlib import sha256
 from logging import basicConfig, INFO, DEBUG, debug
 
+HASH_CHUNK_SIZE = 1024 * 1024
+# Limits of a lambda archive, here so that they can be read without loading the AWS SDK.
+MAX_LAMBDA_SIZE = 50000000
+MAX_UNZIPPED_LAMBDA_SIZE = 262144000
+
 
 def configure_logging(level=None):
     if not level:
@@ -11,3 +17,14 @@ def configure_logging(level=None):
         datefmt='%Y/%m/%d %H:%M:%S',
         level=level,
     )
+
+
+def file_sha256(file):
+    '''
+    Hashes the given file in chunks, returning the SHA-256 `hashlib` object.
+    '''
+    digest = sha256()
+    with open(file, 'rb') as binaryfile:
+        for chunk in iter(lambda: binaryfile.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest
@@ -0,0 +1,112 @@
+'''
+Keeps a lambda archive up to date with its project files while they are edited.
+
+The project files are polled for changes, and the entries of changed files are rewritten
+in the existing archive, without rebuilding the dependencies.
+'''
+
+import os
+import posixpath
+from time import sleep
+from logging import debug, info, warning
+
+from lgw.lambda_bundle import ZIP_EXCLUDES, PYTHON_VERSION
+from lgw.native_bundle import project_entries
+from lgw.archiver import update_archive, is_excluded, DEFAULT_COMPRESSION_LEVEL
+
+DEFAULT_POLL_INTERVAL = 1.0
+
+
+def watch_lambda_archive(
+    context_dir,
+    location,
+    addl_project_files=[],
+    compresslevel=DEFAULT_COMPRESSION_LEVEL,
+    on_update=None,
+    interval=DEFAULT_POLL_INTERVAL,
+    excludes=ZIP_EXCLUDES,
+    python_version=PYTHON_VERSION,
+):
+    '''
+    Watches the project files of the archive at `location` until interrupted, updating
+    the archive whenever one changes.
+
+    :param on_update: Called with `location` after each update of the archive.
+    :param interval: Seconds between polls of the project files.
+    :param excludes: Patterns of the files left out of the archive.
+    :param python_version: Python version the archive is built for.
+    '''
+    info(f'Watching {context_dir} for changes, press Ctrl-C to stop.')
+    previous = snapshot(context_dir, addl_project_files, excludes)
+    try:
+        while True:
+            sleep(interval)
+            current = snapshot(context_dir, addl_project_files, excludes)
+            if update_from_snapshots(
+                location, previous, current, compresslevel, excludes, python_version
+            ):
+                if on_update:
+                    on_update(location)
+            previous = current
+    except KeyboardInterrupt:
+        info('Stopped watching.')
+
+
+def snapshot(context_dir, addl_project_files, excludes=ZIP_EXCLUDES):
+    '''
+    Returns a mapping of each arcname of the project files to its source and the
+    modification time and size of the source.  Files the `.dockerignore` leaves out of
+    the archive are not watched.
+    '''
+    entries = {}
+    for source, arcname in project_entries(context_dir, addl_project_files):
+        if arcname in entries or is_excluded(arcname, excludes):
+            continue
+        try:
+            stat = os.stat(source)
+        except FileNotFoundError:
+            continue
+        entries[arcname] = (source, stat.st_mtime_ns, stat.st_size)
+    return entries
+
+
+def update_from_snapshots(
+    location,
+    previous,
+    current,
+    compresslevel=DEFAULT_COMPRESSION_LEVEL,
+    excludes=ZIP_EXCLUDES,
+    python_version=PYTHON_VERSION,
+):
+    '''
+    Applies the differences between the `previous` and `current` snapshots to the archive.
+
+    :return: True if the archive was updated.
+    '''
+    changed = [(entry[0], name) for name, entry in current.items() if previous.get(name) != entry]
+    removed = [name for name in previous if name not in current]
+    if not changed and not removed:
+        return False
+
+    for _, name in changed:
+        debug(f'Changed: {name}')
+    for name in removed:
+        debug(f'Removed: {name}')
+    if any(name == 'requirements.txt' for _, name in changed):
+        warning('requirements.txt changed, rebuild the archive to update its dependencies.')
+
+    # Unchecked-hash pycs are used without looking at their sources, so those of changed
+    # sources are dropped; the sources are then imported instead.
+    stale = [cached_bytecode(name, python_version) for _, name in changed if name.endswith('.py')]
+    count = update_archive(location, changed, removed + stale, compresslevel, excludes)
+    info(f'Updated {len(changed) + len(removed)} of {count} entries in {location}')
+    return True
+
+
+def cached_bytecode(arcname, python_version=PYTHON_VERSION):
+    '''
+    Returns the arcname of the pyc the lambda's interpreter caches for the `arcname` source.
+    '''
+    directory, filename = posixpath.split(arcname)
+    tag = python_version.replace('.', '')
+    return posixpath.join(directory, '__pycache__', f'{filename[:-3]}.cpython-{tag}.pyc')
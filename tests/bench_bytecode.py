@@ -0,0 +1,75 @@
+'''
+Measures the cold import time of a dependency set shipped as sources only, as pycs next to
+the sources, and as sourceless pycs, with bytecode caching disabled as it is on the
+read-only filesystem of a lambda.
+
+The packages are copied from the running interpreter's environment into a staging tree
+for each layout, and imported in a fresh interpreter with `-B` and the staging tree
+first on the path.
+
+Run with `python -m tests.bench_bytecode [package ...]`.
+'''
+
+import os
+import sys
+import shutil
+import subprocess
+import tempfile
+import importlib.util
+
+from lgw.archiver import compile_tree
+
+RUNS = 7
+DEFAULT_PACKAGES = ['boto3', 'botocore', 's3transfer', 'jmespath', 'dateutil', 'urllib3']
+IMPORTS = ['boto3', 'botocore.session']
+
+TIMER = '''
+import sys, time
+sys.path.insert(0, sys.argv[1])
+started = time.perf_counter()
+%s
+print(time.perf_counter() - started)
+'''
+
+
+def stage(packages, directory):
+    for package in packages:
+        origin = os.path.dirname(importlib.util.find_spec(package).origin)
+        shutil.copytree(
+            origin,
+            os.path.join(directory, package),
+            ignore=shutil.ignore_patterns('__pycache__', '*.pyc'),
+        )
+
+
+def import_time_ms(directory):
+    script = TIMER % '\n'.join(f'import {m}' for m in IMPORTS)
+    timings = []
+    for _ in range(RUNS):
+        result = subprocess.run(
+            [sys.executable, '-B', '-c', script, directory],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        timings.append(float(result.stdout) * 1000)
+    return min(timings)
+
+
+def main():
+    packages = sys.argv[1:] or DEFAULT_PACKAGES
+    layouts = {
+        'sources': lambda d: None,
+        'pyc': lambda d: compile_tree(d),
+        'pyc-only': lambda d: compile_tree(d, sourceless=True),
+    }
+    print('layout           import ms')
+    for layout, prepare in layouts.items():
+        with tempfile.TemporaryDirectory() as directory:
+            stage(packages, directory)
+            prepare(directory)
+            print('%-16s %9.1f' % (layout, import_time_ms(directory)))
+
+
+if __name__ == '__main__':
+    main()
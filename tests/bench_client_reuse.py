@@ -0,0 +1,126 @@
+'''
+Counts the AWS clients and HTTP connection pools created by the `lambda-deploy`,
+`gw-deploy` and `lambda-delete` commands, run against moto.
+
+moto intercepts requests before any connection is opened, so TLS handshakes cannot be
+observed here.  The pool count stands in for them: each client's connection pool opens
+its own TLS connection to the service endpoint, so it is the number of handshakes a
+command needs at minimum.
+
+Run with `python -m tests.bench_client_reuse`.
+'''
+
+import os
+import io
+import json
+import zipfile
+import traceback
+from unittest.mock import patch
+
+import boto3
+import botocore.session
+import botocore.httpsession
+from moto import mock_aws
+
+from lgw.clients import reset_clients
+from lgw.lambda_util import create_or_replace_function, delete_function
+from lgw.api_gateway import create_rest_api
+
+LAMBDA_NAME = 'bench_lambda_name'
+
+
+def called_from_lgw(within=None):
+    '''
+    moto creates clients of its own while serving requests, which are not counted.  When
+    `within` is given, only calls made from a function of that name are counted.
+    '''
+    stack = traceback.extract_stack()
+    if within and not any(frame.name == within for frame in stack):
+        return False
+    return any(f'{os.sep}lgw{os.sep}' in frame.filename for frame in stack) and not any(
+        f'{os.sep}moto{os.sep}' in frame.filename for frame in stack
+    )
+
+
+class Counter:
+    def __init__(self, target, name, within=None):
+        self.count = 0
+        self.original = getattr(target, name)
+        counter = self
+
+        def counted(*args, **kwargs):
+            if called_from_lgw(within):
+                counter.count += 1
+            return counter.original(*args, **kwargs)
+
+        self.patch = patch.object(target, name, counted)
+
+
+def create_execution_role():
+    trust_policy = {
+        'Version': '2012-10-17',
+        'Statement': [
+            {
+                'Effect': 'Allow',
+                'Principal': {'Service': 'lambda.amazonaws.com'},
+                'Action': 'sts:AssumeRole',
+            }
+        ],
+    }
+    response = boto3.client('iam').create_role(
+        RoleName='bench_execution_role', AssumeRolePolicyDocument=json.dumps(trust_policy)
+    )
+    return response['Role']['Arn']
+
+
+def mock_zip():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        zf.writestr('handler.py', 'def handler(event, context):\n    return event\n')
+    return buffer.getvalue()
+
+
+def lambda_deploy(execution_role):
+    for _ in range(2):
+        create_or_replace_function(
+            LAMBDA_NAME,
+            {'ZipFile': mock_zip()},
+            'handler.handler',
+            execution_role,
+            30,
+            128,
+            'python3.12',
+            description='',
+            vpc_config={},
+            environment={},
+            tags={},
+        )
+
+
+def gw_deploy(execution_role):
+    create_rest_api('bench-api', '', [], LAMBDA_NAME, '{proxy+}', 'bench', '', {})
+
+
+def lambda_delete(execution_role):
+    delete_function(LAMBDA_NAME)
+
+
+def main():
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+    with mock_aws():
+        execution_role = create_execution_role()
+        reset_clients()
+        print('command          clients    connection pools')
+        for command in [lambda_deploy, gw_deploy, lambda_delete]:
+            clients = Counter(botocore.session.Session, 'create_client')
+            pools = Counter(botocore.httpsession.URLLib3Session, '__init__', 'get_client_args')
+            with clients.patch, pools.patch:
+                command(execution_role)
+            print('%-16s %7d %19d' % (command.__name__, clients.count, pools.count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+'''
+Measures the peak memory traced while deploying archives of 1 MB to 50 MB through
+`deploy_function_from_zip` against moto.
+
+Run with `python -m tests.bench_deploy_memory`.
+'''
+
+import os
+import json
+import tracemalloc
+import zipfile
+import tempfile
+
+import boto3
+from moto import mock_aws
+
+from lgw.lambda_util import deploy_function_from_zip
+
+SIZES_MB = [1, 5, 10, 25, 49]
+LAMBDA_NAME = 'bench_lambda_name'
+
+
+def write_archive(directory, size_mb):
+    archive = os.path.join(directory, f'bundle-{size_mb}mb.zip')
+    with zipfile.ZipFile(archive, 'w', compression=zipfile.ZIP_STORED) as zf:
+        zf.writestr('handler.py', 'def handler(event, context):\n    return event\n')
+        zf.writestr('padding.bin', os.urandom(size_mb * 1024 * 1024))
+    return archive
+
+
+def create_execution_role():
+    trust_policy = {
+        'Version': '2012-10-17',
+        'Statement': [
+            {
+                'Effect': 'Allow',
+                'Principal': {'Service': 'lambda.amazonaws.com'},
+                'Action': 'sts:AssumeRole',
+            }
+        ],
+    }
+    response = boto3.client('iam').create_role(
+        RoleName='bench_execution_role', AssumeRolePolicyDocument=json.dumps(trust_policy)
+    )
+    return response['Role']['Arn']
+
+
+def measure(archive, execution_role):
+    tracemalloc.start()
+    deploy_function_from_zip(
+        archive,
+        LAMBDA_NAME,
+        'handler.handler',
+        execution_role,
+        30,
+        128,
+        'python3.12',
+        description='',
+        vpc_config={},
+        environment={},
+        tags={},
+    )
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    boto3.client('lambda').delete_function(FunctionName=LAMBDA_NAME)
+    return peak
+
+
+def main():
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+    with mock_aws(), tempfile.TemporaryDirectory() as directory:
+        execution_role = create_execution_role()
+        print('archive MB    peak MB    peak / archive')
+        for size_mb in SIZES_MB:
+            archive = write_archive(directory, size_mb)
+            archive_size = os.stat(archive).st_size
+            peak = measure(archive, execution_role)
+            print('%10d %10.1f %17.2f' % (size_mb, peak / 1024 / 1024, peak / archive_size))
+
+
+if __name__ == '__main__':
+    main()
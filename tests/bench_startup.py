@@ -0,0 +1,61 @@
+'''
+Measures the cold import time each subcommand pays, using `python -X importtime`.
+
+Each run imports `lgw.main` in a fresh interpreter along with the modules the subcommand's
+handler imports when it runs, and reports the fastest of the summed cumulative import time
+of the top-level imports.
+
+Run with `python -m tests.bench_startup`.
+'''
+
+import subprocess
+import sys
+
+RUNS = 7
+
+COMMAND_IMPORTS = {
+    '--version': [],
+    'lambda-archive': ['lgw.lambda_bundle'],
+    'lambda-deploy': ['lgw.lambda_util'],
+    'lambda-invoke': ['lgw.lambda_util'],
+    'lambda-delete': ['lgw.lambda_util'],
+    'gw-deploy': ['lgw.api_gateway'],
+    'gw-undeploy': ['lgw.api_gateway'],
+    'domain-add': ['lgw.api_gateway_domain'],
+    'domain-remove': ['lgw.api_gateway_domain'],
+}
+
+# Imported by `load_config`, which runs for every subcommand but `--version`.
+CONFIG_IMPORTS = ['everett.manager', 'dotenv']
+
+
+def import_time_us(modules):
+    script = '; '.join(f'import {m}' for m in modules)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', script],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        if cumulative.strip().isdigit() and not name.startswith('  '):
+            total += int(cumulative)
+    return total
+
+
+def main():
+    print('command          import ms')
+    for command, imports in COMMAND_IMPORTS.items():
+        modules = ['lgw.main'] + imports
+        if command != '--version':
+            modules += CONFIG_IMPORTS
+        timings = [import_time_us(modules) for _ in range(RUNS)]
+        print('%-16s %9.1f' % (command, min(timings) / 1000))
+
+
+if __name__ == '__main__':
+    main()
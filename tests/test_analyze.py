@@ -0,0 +1,33 @@
+import sys
+import zipfile
+import subprocess
+
+from assertpy import assert_that
+
+from lgw.analyze import analyze_archive, format_report
+
+
+def test_analyze_archive(tmp_path):
+    location = str(tmp_path / 'bundle.zip')
+    with zipfile.ZipFile(location, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('handler.py', 'x' * 100)
+        zf.writestr('pkg/__init__.py', 'x' * 1000)
+        zf.writestr('pkg/core.so', bytes(range(256)) * 100)
+
+    analysis = analyze_archive(location)
+
+    assert_that(analysis['uncompressed']).is_equal_to(26700)
+    assert_that([p[0] for p in analysis['packages']]).is_equal_to(['pkg', 'handler.py'])
+    assert_that(analysis['packages'][0][3]).is_equal_to(2)
+    assert_that(analysis['files'][0][0]).is_equal_to('pkg/core.so')
+
+    report = format_report(analysis, top=1)
+    assert_that(report).contains('of the 47.7 MiB direct upload limit')
+    assert_that(report).contains('of the 250.0 MiB unzipped limit')
+    assert_that(report).contains('pkg/core.so').does_not_contain('pkg/__init__.py')
+
+
+def test_analyze_does_not_import_aws_sdk():
+    script = 'import sys, lgw.analyze; print("botocore" in sys.modules)'
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True)
+    assert_that(result.stdout.strip()).is_equal_to('False')
@@ -1,18 +1,19 @@
 import os
-from logging import info
 import boto3
-from botocore.exceptions import ClientError
 
 import pytest
+from unittest.mock import patch
 from moto import mock_aws
 from assertpy import assert_that
 
+from lgw.clients import reset_clients
 from lgw.util import configure_logging
 from lgw.api_gateway import (
-    create_api_gateway,
     get_root_resource_id,
-    create_resource,
-    create_method,
+    plan_api_changes,
+    apply_plan,
+    openapi_document,
+    import_rest_api,
 )
 
 configure_logging()
@@ -30,6 +31,7 @@ def aws_credentials():
     os.environ['AWS_SECURITY_TOKEN'] = 'testing'
     os.environ['AWS_SESSION_TOKEN'] = 'testing'
     os.environ["AWS_DEFAULT_REGION"] = 'us-east-1'
+    reset_clients()
 
 
 @pytest.fixture(scope='function')
@@ -44,67 +46,147 @@ def api_client(aws_credentials):
         yield boto3.client('apigateway', region_name=DEFAULT_REGION)
 
 
-def create_mock_api_gateway(api_client):
-    api_name = 'mock_api_name'
-    api_description = 'mock_api_description'
-    binary_types = ['image/jpeg']
-    api_id = create_api_gateway(
-        api_client, api_name, api_description=api_description, binary_types=binary_types
-    )
-    info('api_id [%s]' % api_id)
-    return api_id
+LAMBDA_URI = (
+    'arn:aws:apigateway:us-east-1:lambda:path/2015-03-31/functions/'
+    'arn:aws:lambda:us-east-1:123456789012:function:mock_lambda/invocations'
+)
 
 
-def create_mock_root_resource(api_client, api_id):
-    root_id = get_root_resource_id(api_client, api_id)
-    info('root_id: [%s]' % root_id)
-    return root_id
+def plan_mock_api(api_client, lambda_uri=LAMBDA_URI, response_models={}):
+    return plan_api_changes(
+        api_client,
+        'mock_api_name',
+        'mock_api_description',
+        ['image/jpeg'],
+        lambda_uri,
+        '{proxy+}',
+        'mock_stage',
+        '',
+        response_models,
+    )
 
 
-def test_create_api_gateway(api_client):
-    api_id = create_mock_api_gateway(api_client)
-    assert_that(api_id).is_not_none()
-    assert_that(api_id).is_not_empty()
+def test_plan_new_api(api_client):
+    plan = plan_mock_api(api_client)
+
+    assert_that(plan.api_id).is_none()
+    assert_that([(c.action, c.http_method, c.path) for c in plan.changes]).is_equal_to(
+        [
+            ('create_rest_api', None, '/'),
+            ('put_method', 'ANY', '/'),
+            ('put_method_response', 'ANY', '/'),
+            ('put_integration', 'ANY', '/'),
+            ('create_resource', None, '/{proxy+}'),
+            ('put_method', 'ANY', '/{proxy+}'),
+            ('put_method_response', 'ANY', '/{proxy+}'),
+            ('put_integration', 'ANY', '/{proxy+}'),
+            ('create_deployment', None, None),
+        ]
+    )
 
 
-def test_get_root_resource_id(api_client):
-    api_id = create_mock_api_gateway(api_client)
-    root_resource_id = create_mock_root_resource(api_client, api_id)
-    assert_that(root_resource_id).is_not_none()
-    assert_that(root_resource_id).is_not_empty()
+def test_apply_plan_new_api(api_client):
+    plan = plan_mock_api(api_client)
+    assert_that(plan.changes[0].params).has_binaryMediaTypes(['image/jpeg'])
+    api_id = apply_plan(api_client, plan)
 
+    api = api_client.get_rest_api(restApiId=api_id)
+    assert_that(api).has_name('mock_api_name').has_description('mock_api_description')
 
-def test_create_resource(api_client):
-    api_id = create_mock_api_gateway(api_client)
     root_id = get_root_resource_id(api_client, api_id)
+    assert_that(root_id).is_not_empty()
+    resources = {r['path']: r for r in api_client.get_resources(restApiId=api_id)['items']}
+    assert_that(resources['/']['id']).is_equal_to(root_id)
+    assert_that(resources['/{proxy+}']).has_parentId(root_id).has_pathPart('{proxy+}')
+
+    for resource_id in (root_id, resources['/{proxy+}']['id']):
+        method = api_client.get_method(restApiId=api_id, resourceId=resource_id, httpMethod='ANY')
+        assert_that(method).has_httpMethod('ANY').has_authorizationType('NONE')
+        method_response = api_client.get_method_response(
+            restApiId=api_id, resourceId=resource_id, httpMethod='ANY', statusCode='200'
+        )
+        assert_that(method_response).has_statusCode('200')
+
+
+def test_apply_plan(api_client):
+    models = {'application/json': 'Empty'}
+    api_id = apply_plan(api_client, plan_mock_api(api_client, response_models=models))
+
+    resources = {r['path']: r['id'] for r in api_client.get_resources(restApiId=api_id)['items']}
+    integration = api_client.get_integration(
+        restApiId=api_id, resourceId=resources['/{proxy+}'], httpMethod='ANY'
+    )
+    assert_that(integration).has_type('AWS_PROXY').has_uri(LAMBDA_URI)
+    method_response = api_client.get_method_response(
+        restApiId=api_id, resourceId=resources['/{proxy+}'], httpMethod='ANY', statusCode='200'
+    )
+    assert_that(method_response).has_responseModels(models)
+    assert_that(api_client.get_stage(restApiId=api_id, stageName='mock_stage')).is_not_none()
 
-    resource_path = 'mock-resource-path'
+    assert_that(plan_mock_api(api_client, response_models=models).changes).is_empty()
 
-    actual_resource_id = create_resource(api_client, api_id, root_id, resource_path)
 
-    info('actual_resource_id: [%s]' % actual_resource_id)
-    assert_that(actual_resource_id).is_not_none()
-    assert_that(actual_resource_id).is_not_empty()
+def test_plan_changed_api(api_client):
+    apply_plan(api_client, plan_mock_api(api_client))
 
+    lambda_uri = LAMBDA_URI.replace('mock_lambda', 'other_lambda')
+    plan = plan_mock_api(api_client, lambda_uri, {'application/json': 'Empty'})
 
-def test_create_method(api_client):
-    api_id = create_mock_api_gateway(api_client)
-    root_id = get_root_resource_id(api_client, api_id)
+    assert_that([(c.action, c.http_method, c.path) for c in plan.changes]).is_equal_to(
+        [
+            ('put_integration', 'ANY', '/'),
+            ('delete_method_response', 'ANY', '/{proxy+}'),
+            ('put_method_response', 'ANY', '/{proxy+}'),
+            ('put_integration', 'ANY', '/{proxy+}'),
+            ('create_deployment', None, None),
+        ]
+    )
+    apply_plan(api_client, plan)
+    plan = plan_mock_api(api_client, lambda_uri, {'application/json': 'Empty'})
+    assert_that(plan.changes).is_empty()
+
+
+def test_openapi_document():
+    document = openapi_document(
+        'mock_api_name',
+        'mock_api_description',
+        ['image/jpeg'],
+        LAMBDA_URI,
+        '{proxy+}',
+        '',
+        {'application/json': 'Empty'},
+    )
 
-    create_method(api_client, api_id, root_id, 'GET')
+    assert_that(document['paths']).contains_only('/', '/{proxy+}')
+    assert_that(document['x-amazon-apigateway-binary-media-types']).is_equal_to(['image/jpeg'])
+    assert_that(document['components']['schemas']).contains_only('Empty')
+    proxy = document['paths']['/{proxy+}']['x-amazon-apigateway-any-method']
+    assert_that(proxy['parameters'][0]).has_name('proxy').has_required(True)
+    assert_that(proxy['responses']['200']['content']).contains_only('application/json')
+    integration = proxy['x-amazon-apigateway-integration']
+    assert_that(integration).has_type('aws_proxy').has_uri(LAMBDA_URI)
+    assert_that(integration).does_not_contain_key('credentials')
+    root = document['paths']['/']['x-amazon-apigateway-any-method']
+    assert_that(root).does_not_contain_key('parameters')
 
-    method = api_client.get_method(restApiId=api_id, resourceId=root_id, httpMethod='GET')
 
-    assert_that(method).is_not_none()
-    assert_that(method).contains('httpMethod')
-    assert_that(method).has_httpMethod('GET')
+def test_openapi_document_custom_model():
+    with pytest.raises(ValueError):
+        openapi_document('mock_api_name', '', [], LAMBDA_URI, '{proxy+}', '', {'a/b': 'Custom'})
 
-    method_response = api_client.get_method_response(
-        restApiId=api_id, resourceId=root_id, httpMethod='GET', statusCode='200'
-    )
 
-    assert_that(method_response).contains('statusCode')
-    assert_that(method_response).has_statusCode('200')
+def test_import_rest_api(api_client):
+    lambda_info = ('arn', LAMBDA_URI, DEFAULT_REGION, '123456789012')
+    args = ('mock_api_name', 'mock_api_description', [], 'mock_lambda', '{proxy+}')
+    args += ('mock_stage', '', {'application/json': 'Empty'})
+
+    with patch('lgw.api_gateway.get_lambda_info', return_value=lambda_info):
+        url = import_rest_api(*args)
+        api_id = api_client.get_rest_apis()['items'][0]['id']
+        assert_that(url).starts_with(f'https://{api_id}.execute-api.{DEFAULT_REGION}')
+
+        assert_that(import_rest_api(*args)).is_equal_to(url)
+        assert_that(api_client.get_rest_apis()['items']).is_length(1)
 
 
 # def test_link_lambda_with_gateway(api_client, api_id, root_resource_id, lambda_uri):
@@ -0,0 +1,88 @@
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+from assertpy import assert_that
+
+from lgw.api_index import configure_api_index, lookup_api_id, remember_api, forget_api
+
+DEFAULT_REGION = 'us-east-1'
+
+
+@pytest.fixture(scope='function')
+def api_client():
+    os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
+    os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
+    os.environ["AWS_DEFAULT_REGION"] = DEFAULT_REGION
+    with mock_aws():
+        yield boto3.client('apigateway', region_name=DEFAULT_REGION)
+
+
+@pytest.fixture(scope='function')
+def cache_file(tmp_path):
+    cache_file = tmp_path / 'cache' / 'api-index.json'
+    configure_api_index(str(cache_file))
+    yield cache_file
+    configure_api_index(None)
+
+
+def record_calls(api_client):
+    calls = []
+    api_client.meta.events.register(
+        'before-call.api-gateway.*', lambda model, **kwargs: calls.append(model.name)
+    )
+    return calls
+
+
+def test_lookup_pages_through_apis(api_client):
+    ids = [api_client.create_rest_api(name=f'api-{i}')['id'] for i in range(30)]
+
+    assert_that(lookup_api_id(api_client, 'api-29')).is_equal_to(ids[29])
+    assert_that(lookup_api_id(api_client, 'missing')).is_none()
+
+
+def test_lookup_uses_cached_index(api_client, cache_file):
+    api_id = api_client.create_rest_api(name='cached')['id']
+    assert_that(lookup_api_id(api_client, 'cached')).is_equal_to(api_id)
+    assert_that(str(cache_file)).exists()
+
+    calls = record_calls(api_client)
+    assert_that(lookup_api_id(api_client, 'cached')).is_equal_to(api_id)
+    assert_that(calls).is_equal_to(['GetRestApi'])
+
+
+def test_lookup_rebuilds_stale_index(api_client, cache_file):
+    api_id = api_client.create_rest_api(name='stale')['id']
+    lookup_api_id(api_client, 'stale')
+    api_client.delete_rest_api(restApiId=api_id)
+    new_id = api_client.create_rest_api(name='stale')['id']
+
+    calls = record_calls(api_client)
+    assert_that(lookup_api_id(api_client, 'stale')).is_equal_to(new_id)
+    assert_that(calls).is_equal_to(['GetRestApi', 'GetRestApis'])
+
+
+def test_lookup_rebuilds_expired_index(api_client, cache_file):
+    configure_api_index(str(cache_file), ttl=-1)
+    api_client.create_rest_api(name='expired')
+    lookup_api_id(api_client, 'expired')
+
+    calls = record_calls(api_client)
+    lookup_api_id(api_client, 'expired')
+    assert_that(calls).is_equal_to(['GetRestApis'])
+
+
+def test_remember_and_forget_api(api_client, cache_file):
+    lookup_api_id(api_client, 'created')
+    api_id = api_client.create_rest_api(name='created')['id']
+    remember_api(api_client, 'created', api_id)
+
+    calls = record_calls(api_client)
+    assert_that(lookup_api_id(api_client, 'created')).is_equal_to(api_id)
+    assert_that(calls).is_equal_to(['GetRestApi'])
+
+    forget_api(api_client, 'created')
+    api_client.delete_rest_api(restApiId=api_id)
+    assert_that(lookup_api_id(api_client, 'created')).is_none()
+    assert_that(calls).is_equal_to(['GetRestApi', 'DeleteRestApi', 'GetRestApis'])
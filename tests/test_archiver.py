@@ -0,0 +1,110 @@
+import os
+import zipfile
+
+import pytest
+from assertpy import assert_that
+
+from lgw.archiver import write_archive, update_archive, compile_tree, tree_entries, is_excluded
+from lgw.lambda_bundle import ZIP_EXCLUDES
+
+
+@pytest.fixture(scope='function')
+def tree(tmp_path):
+    root = tmp_path / 'tree'
+    for name in ['b.py', 'a/z.py', 'a/__pycache__/z.cpython-312.pyc', 'bin/tool']:
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_text(f'# {name}\n' * 100)
+    os.chmod(root / 'bin' / 'tool', 0o755)
+    return root
+
+
+def test_write_archive(tree, tmp_path):
+    location = str(tmp_path / 'out.zip')
+    count = write_archive(location, tree_entries(str(tree)), excludes=['*__pycache__*'])
+
+    assert_that(count).is_equal_to(3)
+    with zipfile.ZipFile(location) as zf:
+        assert_that(zf.testzip()).is_none()
+        assert_that(zf.namelist()).is_equal_to(['a/z.py', 'b.py', 'bin/tool'])
+        assert_that(zf.read('b.py')).is_equal_to((tree / 'b.py').read_bytes())
+        assert_that({i.date_time for i in zf.infolist()}).is_equal_to({(1980, 1, 1, 0, 0, 0)})
+        modes = {i.filename: i.external_attr >> 16 for i in zf.infolist()}
+        assert_that(modes).contains_entry({'b.py': 0o100644}, {'bin/tool': 0o100755})
+
+
+def test_write_archive_is_reproducible(tree, tmp_path):
+    serial = tmp_path / 'serial.zip'
+    parallel = tmp_path / 'parallel.zip'
+
+    write_archive(str(serial), tree_entries(str(tree)), processes=1)
+    os.utime(tree / 'b.py', (0, 0))
+    write_archive(str(parallel), reversed(list(tree_entries(str(tree)))), processes=2)
+
+    assert_that(parallel.read_bytes()).is_equal_to(serial.read_bytes())
+
+
+def test_write_archive_keeps_first_entry(tree, tmp_path):
+    location = str(tmp_path / 'out.zip')
+    write_archive(location, [(str(tree / 'b.py'), 'x.py'), (str(tree / 'a/z.py'), 'x.py')], 0)
+
+    with zipfile.ZipFile(location) as zf:
+        assert_that(zf.read('x.py')).is_equal_to((tree / 'b.py').read_bytes())
+        assert_that(zf.getinfo('x.py').compress_type).is_equal_to(zipfile.ZIP_STORED)
+
+
+@pytest.mark.parametrize(
+    "arcname, excluded",
+    [
+        ('handler.py', False),
+        ('pkg/__init__.py', False),
+        ('pkg/__pycache__/x.cpython-312.pyc', True),
+        ('pkg-1.0.dist-info/RECORD', True),
+        ('pip/__init__.py', True),
+        # `*/bin` only matches an arcname ending in `/bin`, as with `zip --exclude`.
+        ('bin/normalizer', False),
+        ('mypkg/bin/tool.py', False),
+    ],
+)
+def test_is_excluded(arcname, excluded):
+    assert_that(is_excluded(arcname, ZIP_EXCLUDES)).is_equal_to(excluded)
+
+
+def test_update_archive_matches_full_write(tree, tmp_path):
+    updated = tmp_path / 'updated.zip'
+    full = tmp_path / 'full.zip'
+    write_archive(str(updated), tree_entries(str(tree)), processes=1)
+
+    (tree / 'b.py').write_text('changed\n')
+    (tree / 'c.py').write_text('added\n')
+    count = update_archive(
+        str(updated), [(str(tree / 'b.py'), 'b.py'), (str(tree / 'c.py'), 'c.py')], ['bin/tool']
+    )
+    os.remove(tree / 'bin' / 'tool')
+    write_archive(str(full), tree_entries(str(tree)), processes=1)
+
+    assert_that(count).is_equal_to(4)
+    assert_that(updated.read_bytes()).is_equal_to(full.read_bytes())
+
+
+def test_compile_tree(tmp_path):
+    (tmp_path / 'pkg').mkdir()
+    (tmp_path / 'pkg' / 'mod.py').write_text('X = 1\n')
+    (tmp_path / 'pkg' / 'broken.py').write_text('def (\n')
+
+    compile_tree(str(tmp_path))
+    cached = list((tmp_path / 'pkg' / '__pycache__').glob('mod.*.pyc'))
+    assert_that(cached).is_length(1)
+    # Flags of an unchecked-hash pyc: hash based, without source checks.
+    assert_that(int.from_bytes(cached[0].read_bytes()[4:8], 'little')).is_equal_to(1)
+
+    compile_tree(str(tmp_path), sourceless=True)
+    names = sorted(p.name for p in (tmp_path / 'pkg').iterdir())
+    assert_that(names).is_equal_to(['broken.py', 'mod.pyc'])
+
+
+def test_write_archive_with_prefix(tree, tmp_path):
+    location = str(tmp_path / 'layer.zip')
+    write_archive(location, tree_entries(str(tree)), excludes=['/bin/*'], prefix='python')
+
+    with zipfile.ZipFile(location) as zf:
+        assert_that(zf.namelist()).contains('python/b.py').does_not_contain('python/bin/tool')
@@ -0,0 +1,92 @@
+from itertools import count
+
+from assertpy import assert_that
+
+from lgw.build_events import (
+    build_events,
+    BuildTimeline,
+    StepStarted,
+    StepFinished,
+    LayerPulled,
+    BuildOutput,
+    BuildFailed,
+    ImageBuilt,
+)
+
+BUILD_STREAM = [
+    {'stream': 'Step 1/3 : FROM python:3.12'},
+    {'stream': '\n'},
+    {'status': 'Pulling fs layer', 'progressDetail': {}, 'id': 'a1'},
+    {'status': 'Downloading', 'progressDetail': {'current': 10, 'total': 2048}, 'id': 'a1'},
+    {'status': 'Downloading', 'progressDetail': {'current': 2048, 'total': 2048}, 'id': 'a1'},
+    {'status': 'Download complete', 'progressDetail': {}, 'id': 'a1'},
+    {'stream': ' ---> 3f3b7a2\n'},
+    {'stream': 'Step 2/3 : RUN pip install -r requirements.txt\n'},
+    {'stream': ' ---> Using cache\n ---> 623eaff\n'},
+    {'stream': 'Step 3/3 : COPY handler.py .\n'},
+    {'stream': ' ---> 511f905\n'},
+    {'aux': {'ID': 'sha256:a6b4ecb'}},
+    {'stream': 'Successfully built a6b4ecb\n'},
+]
+
+
+def clock():
+    ticks = count()
+    return lambda: float(next(ticks))
+
+
+def test_build_events():
+    events = list(build_events(BUILD_STREAM, clock()))
+
+    assert_that(events).is_equal_to(
+        [
+            StepStarted(1, 3, 'FROM python:3.12'),
+            LayerPulled('a1', 2048),
+            BuildOutput(' ---> 3f3b7a2'),
+            StepFinished(1, 'FROM python:3.12', 1.0, None),
+            StepStarted(2, 3, 'RUN pip install -r requirements.txt'),
+            BuildOutput(' ---> 623eaff'),
+            StepFinished(2, 'RUN pip install -r requirements.txt', 1.0, True),
+            StepStarted(3, 3, 'COPY handler.py .'),
+            BuildOutput(' ---> 511f905'),
+            ImageBuilt('sha256:a6b4ecb'),
+            BuildOutput('Successfully built a6b4ecb'),
+            StepFinished(3, 'COPY handler.py .', 1.0, False),
+        ]
+    )
+
+
+def test_build_events_error():
+    stream = [
+        {'stream': 'Step 1/1 : RUN false\n'},
+        {'stream': ' ---> Running in 511f905\n'},
+        {'errorDetail': {'code': 1}, 'error': 'The command returned a non-zero code: 1\n'},
+    ]
+    events = list(build_events(stream, clock()))
+
+    assert_that(events).contains(BuildFailed('The command returned a non-zero code: 1'))
+    assert_that(events[-1]).is_equal_to(StepFinished(1, 'RUN false', 1.0, False))
+
+
+def test_build_timeline():
+    timeline = BuildTimeline('lambda-bundle:3.12-arm64')
+    for event in build_events(BUILD_STREAM, clock()):
+        timeline.add(event)
+
+    assert_that(timeline.seconds).is_equal_to(3.0)
+    assert_that(timeline.summary().splitlines()).is_equal_to(
+        [
+            'Built lambda-bundle:3.12-arm64 in 3.0s: 1 of 3 steps cached, 0.0 MB pulled',
+            '      1.0s  COPY handler.py .',
+        ]
+    )
+    report = timeline.as_dict()
+    assert_that(report).has_image_id('sha256:a6b4ecb').has_bytes_pulled(2048).has_errors([])
+    assert_that(report['steps'][1]).is_equal_to(
+        {
+            'number': 2,
+            'instruction': 'RUN pip install -r requirements.txt',
+            'seconds': 1.0,
+            'cached': True,
+        }
+    )
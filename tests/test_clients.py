@@ -0,0 +1,34 @@
+from assertpy import assert_that
+
+from lgw.clients import get_client, configure_clients, reset_clients
+
+
+def setup_function():
+    reset_clients()
+
+
+def test_get_client_is_shared():
+    client = get_client('lambda', 'us-east-1')
+
+    assert_that(get_client('lambda', 'us-east-1')).is_same_as(client)
+    assert_that(get_client('lambda', 'us-west-2')).is_not_same_as(client)
+    assert_that(get_client('apigateway', 'us-east-1')).is_not_same_as(client)
+
+
+def test_configure_clients():
+    client = get_client('lambda', 'us-east-1')
+
+    configure_clients(max_pool_connections=25, retry_mode='adaptive', read_timeout=5)
+    configured = get_client('lambda', 'us-east-1')
+
+    assert_that(configured).is_not_same_as(client)
+    assert_that(configured.meta.config.max_pool_connections).is_equal_to(25)
+    assert_that(configured.meta.config.retries).contains_entry({'mode': 'adaptive'})
+    assert_that(configured.meta.config.read_timeout).is_equal_to(5)
+
+
+def test_get_client_with_larger_pool():
+    pooled = get_client('lambda', 'us-east-1', max_pool_connections=64)
+
+    assert_that(pooled.meta.config.max_pool_connections).is_equal_to(64)
+    assert_that(get_client('lambda', 'us-east-1')).is_not_same_as(pooled)
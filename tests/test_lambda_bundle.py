@@ -0,0 +1,205 @@
+import io
+import tarfile
+from unittest.mock import MagicMock
+
+import pytest
+from docker.errors import ImageNotFound
+from assertpy import assert_that
+
+from lgw.archiver import is_excluded
+from lgw.lambda_bundle import (
+    archive_excludes,
+    base_image,
+    target_archive_name,
+    create_deps_dockerfile,
+    create_deps_context,
+    create_dockerfile,
+    dependency_hash,
+    install_deps_with_cache,
+    compile_dockerignore_pattern,
+    is_ignored,
+    stream_docker_context,
+    write_file_from_tar,
+)
+
+
+def test_dependency_hash_tracks_dependency_inputs():
+    dockerfile = create_deps_dockerfile([])
+    digest = dependency_hash(dockerfile, b'requests==2.32.3\n')
+
+    assert_that(dependency_hash(create_deps_dockerfile([]), b'requests==2.32.3\n')).is_equal_to(
+        digest
+    )
+    assert_that(dependency_hash(dockerfile, b'requests==2.32.4\n')).is_not_equal_to(digest)
+    assert_that(
+        dependency_hash(create_deps_dockerfile(['gcc']), b'requests==2.32.3\n')
+    ).is_not_equal_to(digest)
+
+
+@pytest.mark.parametrize(
+    "arcname, excluded",
+    [
+        ('handler.py', False),
+        ('pkg/tests/test_pkg.py', True),
+        ('tests/test_handler.py', True),
+        ('pkg/testing.py', False),
+        ('pkg/docs.py', False),
+        ('pkg/docs/index.rst', True),
+        ('pkg/__init__.pyi', True),
+        ('botocore/data/endpoints.json', False),
+        ('botocore/data/s3/2006-03-01/service-2.json.gz', False),
+        ('botocore/data/ec2/2016-11-15/service-2.json.gz', True),
+        ('boto3/data/ec2/2016-11-15/resources-1.json', True),
+        ('botocore/data/s3/__pycache__/x.pyc', True),
+    ],
+)
+def test_archive_excludes_prune_profiles(arcname, excluded):
+    excludes = archive_excludes(['tests', 'docs', 'stubs', 'botocore'], ['s3'])
+
+    assert_that(is_excluded(arcname, excludes)).is_equal_to(excluded)
+
+
+def test_archive_excludes_unknown_profile():
+    with pytest.raises(ValueError):
+        archive_excludes(['everything'])
+
+
+def test_build_targets():
+    image = base_image('3.13', 'x86_64')
+
+    assert_that(image).ends_with(':build-3.13.2024.10.18-x86_64')
+    assert_that(create_deps_dockerfile([], image=image)).starts_with(f'FROM {image} AS base\n')
+    assert_that(
+        dependency_hash(create_deps_dockerfile([], image=image), b'requests\n')
+    ).is_not_equal_to(dependency_hash(create_deps_dockerfile([]), b'requests\n'))
+    assert_that(target_archive_name('lambda-bundle.zip', 'arm64')).is_equal_to(
+        'lambda-bundle-arm64.zip'
+    )
+    with pytest.raises(ValueError):
+        base_image('3.12', 'riscv64')
+
+
+def test_dockerfile_builds_on_dependency_image():
+    dockerfile = create_dockerfile('bundle.zip', [('app.py', './'), ('lib/', './lib/')], 'deps:1')
+
+    assert_that(dockerfile).starts_with('FROM deps:1\n')
+    assert_that(dockerfile).contains('COPY app.py ./\nCOPY lib/ ./lib/\n')
+    assert_that(dockerfile).does_not_contain('pip install')
+    assert_that(dockerfile).does_not_contain('--layer')
+
+
+def test_dockerfile_writes_layer_archive():
+    dockerfile = create_dockerfile('bundle.zip', [], 'deps:1', layer=True)
+
+    assert_that(dockerfile).contains('--layer $output/bundle-layer.zip ')
+
+
+def test_deps_context_holds_only_dependency_inputs():
+    context = create_deps_context(create_deps_dockerfile([]), b'requests\n')
+
+    with tarfile.open(fileobj=context) as tar:
+        assert_that(tar.getnames()).is_equal_to(['Dockerfile', 'requirements.txt'])
+        assert_that(tar.extractfile('requirements.txt').read()).is_equal_to(b'requests\n')
+
+
+def test_deps_image_installs_from_wheelhouse(tmp_path):
+    (tmp_path / 'requests-2.32.3-py3-none-any.whl').write_bytes(b'wheel')
+    dockerfile = create_deps_dockerfile([], wheelhouse=True)
+    context = create_deps_context(dockerfile, b'requests\n', str(tmp_path))
+
+    assert_that(dockerfile).contains('COPY wheelhouse /home/wheelhouse/\n')
+    assert_that(dockerfile).contains('pip install --no-index --find-links /home/wheelhouse/ -r')
+    with tarfile.open(fileobj=context) as tar:
+        assert_that(tar.getnames()).is_equal_to(
+            ['Dockerfile', 'requirements.txt', 'wheelhouse/requests-2.32.3-py3-none-any.whl']
+        )
+
+    digest = dependency_hash(dockerfile, b'requests\n', str(tmp_path))
+    (tmp_path / 'urllib3-2.2.3-py3-none-any.whl').write_bytes(b'wheel')
+    assert_that(dependency_hash(dockerfile, b'requests\n', str(tmp_path))).is_not_equal_to(digest)
+
+
+def test_deps_install_pulls_missing_base_image(tmp_path):
+    client = MagicMock()
+    container = MagicMock()
+    container.logs.return_value = [b'Successfully installed requests\n']
+    container.wait.return_value = {'StatusCode': 0}
+    client.containers.create.side_effect = [ImageNotFound('no such image'), container]
+
+    image = base_image('3.12', 'x86_64')
+    install_deps_with_cache(
+        client, 'abc', b'requests\n', str(tmp_path), image=image, platform='linux/amd64'
+    )
+
+    client.images.pull.assert_called_once_with(image, platform='linux/amd64')
+    assert_that(client.containers.create.call_count).is_equal_to(2)
+    container.commit.assert_called_once()
+    container.remove.assert_called_once_with(force=True)
+
+
+@pytest.mark.parametrize(
+    "pattern, path, ignored",
+    [
+        ('**/*.pyc', 'a.pyc', True),
+        ('**/*.pyc', 'pkg/sub/a.pyc', True),
+        ('*.pyc', 'pkg/a.pyc', False),
+        ('.git/', '.git/config', True),
+        ('/node_modules', 'node_modules/left-pad/index.js', True),
+        ('node_modules', 'web/node_modules', False),
+        ('**/node_modules', 'web/node_modules', True),
+        ('docs/**/draft?.md', 'docs/a/b/draft1.md', True),
+        ('[ab].txt', 'c.txt', False),
+    ],
+)
+def test_dockerignore_pattern(pattern, path, ignored):
+    assert_that(is_ignored(path, [compile_dockerignore_pattern(pattern)])).is_equal_to(ignored)
+
+
+def test_dockerignore_exception():
+    patterns = [compile_dockerignore_pattern(p) for p in ['*.md', '!README.md']]
+
+    assert_that(is_ignored('NOTES.md', patterns)).is_true()
+    assert_that(is_ignored('README.md', patterns)).is_false()
+
+
+def test_stream_docker_context(tmp_path):
+    (tmp_path / '.dockerignore').write_text('# comment\nnode_modules\n.venv/\n*.log\n')
+    (tmp_path / 'requirements.txt').write_text('requests\n')
+    (tmp_path / 'app.log').write_text('log')
+    for ignored in ['node_modules/left-pad', '.venv/lib', 'pkg/__pycache__']:
+        (tmp_path / ignored).mkdir(parents=True)
+        (tmp_path / ignored / 'x.py').write_text('')
+    (tmp_path / 'pkg' / 'handler.py').write_text('')
+
+    context = b''.join(stream_docker_context('FROM scratch\n', str(tmp_path)))
+
+    with tarfile.open(fileobj=io.BytesIO(context)) as tar:
+        assert_that(tar.getnames()).is_equal_to(
+            [
+                'pkg',
+                '.dockerignore',
+                'requirements.txt',
+                'pkg/handler.py',
+                'Dockerfile',
+                'lgw_archiver.py',
+            ]
+        )
+        assert_that(tar.extractfile('Dockerfile').read()).is_equal_to(b'FROM scratch\n')
+
+
+def test_write_file_from_streamed_tar(tmp_path):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as tar:
+        data = bytes(range(256)) * 1000
+        tinfo = tarfile.TarInfo('bundle.zip')
+        tinfo.size = len(data)
+        tar.addfile(tinfo, io.BytesIO(data))
+    stream = buffer.getvalue()
+    chunks = (stream[i : i + 777] for i in range(0, len(stream), 777))
+
+    location = write_file_from_tar(chunks, str(tmp_path), 'bundle.zip')
+
+    assert_that(location).is_equal_to(f'{tmp_path}/bundle.zip')
+    assert_that((tmp_path / 'bundle.zip').read_bytes()).is_equal_to(data)
+    with pytest.raises(FileNotFoundError):
+        write_file_from_tar([stream], str(tmp_path), 'other.zip')
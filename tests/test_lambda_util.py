@@ -0,0 +1,355 @@
+import os
+import io
+import json
+import zipfile
+import boto3
+
+import pytest
+from moto import mock_aws
+from assertpy import assert_that
+
+from lgw.clients import reset_clients
+from lgw.util import configure_logging
+from unittest.mock import patch, MagicMock
+from lgw.lambda_util import (
+    create_or_replace_function,
+    deploy_function,
+    archive_sha256,
+    delete_function,
+    read_payloads,
+    invoke_batch,
+    invoke_function,
+    invoke_function_stream,
+    detect_architecture,
+)
+
+configure_logging()
+
+DEFAULT_REGION = 'us-east-1'
+LAMBDA_NAME = 'mock_lambda_name'
+
+
+@pytest.fixture(scope='function')
+def aws_credentials():
+    '''
+    Mocked AWS Credentials for moto.
+    '''
+    os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
+    os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
+    os.environ['AWS_SECURITY_TOKEN'] = 'testing'
+    os.environ['AWS_SESSION_TOKEN'] = 'testing'
+    os.environ["AWS_DEFAULT_REGION"] = 'us-east-1'
+    reset_clients()
+
+
+@pytest.fixture(scope='function')
+def lambda_client(aws_credentials):
+    with mock_aws():
+        yield boto3.client('lambda', region_name=DEFAULT_REGION)
+
+
+@pytest.fixture(scope='function')
+def execution_role(lambda_client):
+    iam_client = boto3.client('iam', region_name=DEFAULT_REGION)
+    trust_policy = {
+        'Version': '2012-10-17',
+        'Statement': [
+            {
+                'Effect': 'Allow',
+                'Principal': {'Service': 'lambda.amazonaws.com'},
+                'Action': 'sts:AssumeRole',
+            }
+        ],
+    }
+    response = iam_client.create_role(
+        RoleName='mock_execution_role', AssumeRolePolicyDocument=json.dumps(trust_policy)
+    )
+    return response['Role']['Arn']
+
+
+def mock_zip(body='def handler(event, context):\n    return event\n'):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        zf.writestr('handler.py', body)
+    return buffer.getvalue()
+
+
+def deploy_mock_function(execution_role, code, memory_size=128, tags={}):
+    return create_or_replace_function(
+        LAMBDA_NAME,
+        code,
+        'handler.handler',
+        execution_role,
+        30,
+        memory_size,
+        'python3.12',
+        description='mock description',
+        vpc_config={},
+        environment={'KEY': 'value'},
+        tags=tags,
+    )
+
+
+def test_create_function(lambda_client, execution_role):
+    arn = deploy_mock_function(execution_role, {'ZipFile': mock_zip()})
+
+    assert_that(arn).contains(LAMBDA_NAME)
+    config = lambda_client.get_function_configuration(FunctionName=LAMBDA_NAME)
+    assert_that(config).has_MemorySize(128)
+
+
+def test_update_function_in_place(lambda_client, execution_role):
+    deploy_mock_function(execution_role, {'ZipFile': mock_zip()})
+    created = lambda_client.get_function_configuration(FunctionName=LAMBDA_NAME)
+
+    arn = deploy_mock_function(
+        execution_role, {'ZipFile': mock_zip('# changed\n')}, memory_size=256, tags={'a': 'b'}
+    )
+
+    updated = lambda_client.get_function_configuration(FunctionName=LAMBDA_NAME)
+    assert_that(arn).is_equal_to(created['FunctionArn'])
+    assert_that(updated).has_MemorySize(256)
+    assert_that(updated['CodeSha256']).is_not_equal_to(created['CodeSha256'])
+
+    versions = lambda_client.list_versions_by_function(FunctionName=LAMBDA_NAME)['Versions']
+    assert_that([v['Version'] for v in versions]).contains('$LATEST', '1', '2')
+
+    tags = lambda_client.list_tags(Resource=updated['FunctionArn'])['Tags']
+    assert_that(tags).contains_entry({'a': 'b'})
+
+
+def write_mock_archive(tmp_path, body='def handler(event, context):\n    return event\n'):
+    archive = tmp_path / 'lambda-bundle.zip'
+    archive.write_bytes(mock_zip(body))
+    return str(archive)
+
+
+def deploy_mock_archive(
+    execution_role, archive, memory_size=128, architecture=None, layer_archive=None
+):
+    return deploy_function(
+        archive,
+        LAMBDA_NAME,
+        'handler.handler',
+        execution_role,
+        30,
+        memory_size,
+        'python3.12',
+        '',
+        '',
+        'mock description',
+        '',
+        '',
+        'KEY=value',
+        'a=b',
+        architecture=architecture,
+        layer_archive=layer_archive,
+        layer_name='mock_layer',
+    )
+
+
+def test_archive_sha256_matches_code_sha256(lambda_client, execution_role, tmp_path):
+    archive = write_mock_archive(tmp_path)
+    deploy_mock_archive(execution_role, archive)
+
+    config = lambda_client.get_function_configuration(FunctionName=LAMBDA_NAME)
+    assert_that(archive_sha256(archive)).is_equal_to(config['CodeSha256'])
+
+
+def test_deploy_skips_unchanged_code(lambda_client, execution_role, tmp_path):
+    archive = write_mock_archive(tmp_path)
+    deploy_mock_archive(execution_role, archive)
+
+    with patch('lgw.lambda_util.deploy_function_from_zip') as patched_upload:
+        deploy_mock_archive(execution_role, archive, memory_size=256)
+        patched_upload.assert_not_called()
+
+    config = lambda_client.get_function_configuration(FunctionName=LAMBDA_NAME)
+    assert_that(config).has_MemorySize(256)
+
+
+def test_delete_function(lambda_client, execution_role):
+    deploy_mock_function(execution_role, {'ZipFile': mock_zip()})
+
+    delete_function(LAMBDA_NAME)
+
+    functions = lambda_client.list_functions()['Functions']
+    assert_that([f['FunctionName'] for f in functions]).does_not_contain(LAMBDA_NAME)
+
+
+def test_delete_missing_function(lambda_client):
+    delete_function(LAMBDA_NAME)
+
+
+def test_read_payloads_from_jsonl(tmp_path):
+    batch = tmp_path / 'payloads.jsonl'
+    batch.write_text('{"a": 1}\n\n{"a": 2}\n')
+
+    assert_that(read_payloads(str(batch))).is_equal_to([b'{"a": 1}', b'{"a": 2}'])
+
+
+def test_read_payloads_from_directory(tmp_path):
+    (tmp_path / 'b.json').write_text('{"a": 2}')
+    (tmp_path / 'a.json').write_text('{"a": 1}')
+    (tmp_path / 'notes.txt').write_text('ignored')
+
+    assert_that(read_payloads(str(tmp_path))).is_equal_to([b'{"a": 1}', b'{"a": 2}'])
+
+
+def mock_invoke(FunctionName, InvocationType, Payload):
+    response = {'StatusCode': 200, 'Payload': io.BytesIO(Payload)}
+    if json.loads(Payload).get('fail'):
+        response['FunctionError'] = 'Unhandled'
+    return response
+
+
+def test_invoke_batch():
+    payloads = [json.dumps({'fail': i % 4 == 0}).encode('utf8') for i in range(20)]
+    client = MagicMock()
+    client.invoke.side_effect = mock_invoke
+
+    with patch('lgw.lambda_util.get_client', return_value=client):
+        summary = invoke_batch(LAMBDA_NAME, payloads, concurrency=4)
+
+    assert_that(client.invoke.call_count).is_equal_to(20)
+    assert_that(summary).has_invocations(20).has_errors(5)
+    assert_that(summary['results']).is_length(20)
+    assert_that([r['index'] for r in summary['results']]).is_equal_to(list(range(20)))
+    latency = summary['latency_ms']
+    assert_that(latency['p50']).is_less_than_or_equal_to(latency['p95'])
+    assert_that(latency['p95']).is_less_than_or_equal_to(latency['p99'])
+
+
+def test_invoke_function_streams_payload_file(tmp_path):
+    payload = tmp_path / 'payload.json'
+    payload.write_text('{"a": 1}')
+    client = MagicMock()
+    client.invoke.side_effect = lambda Payload, **kwargs: {'Sent': Payload.read(), **kwargs}
+
+    with patch('lgw.lambda_util.get_client', return_value=client):
+        response = invoke_function(LAMBDA_NAME, str(payload), invocation_type='Event')
+
+    assert_that(response).has_Sent(b'{"a": 1}').has_InvocationType('Event')
+    assert_that(response).does_not_contain_key('LogType')
+
+
+def test_invoke_function_stream():
+    client = MagicMock()
+    client.invoke_with_response_stream.return_value = {
+        'EventStream': [
+            {'PayloadChunk': {'Payload': b'{"a": '}},
+            {'PayloadChunk': {'Payload': b'1}'}},
+            {'InvokeComplete': {'LogResult': ''}},
+        ]
+    }
+    out = io.BytesIO()
+
+    with patch('lgw.lambda_util.get_client', return_value=client):
+        complete = invoke_function_stream(LAMBDA_NAME, out)
+
+    assert_that(out.getvalue()).is_equal_to(b'{"a": 1}')
+    assert_that(complete).does_not_contain_key('ErrorCode')
+    kwargs = client.invoke_with_response_stream.call_args.kwargs
+    assert_that(kwargs).has_InvocationType('RequestResponse')
+
+
+def test_invoke_function_stream_dry_run():
+    client = MagicMock()
+    client.invoke_with_response_stream.return_value = {'StatusCode': 204}
+    out = io.BytesIO()
+
+    with patch('lgw.lambda_util.get_client', return_value=client):
+        complete = invoke_function_stream(LAMBDA_NAME, out, invocation_type='DryRun')
+
+    assert_that(complete).is_empty()
+    assert_that(out.getvalue()).is_empty()
+
+
+def elf_header(machine):
+    return b'\x7fELF\x02\x01\x01' + bytes(11) + machine.to_bytes(2, 'little') + bytes(44)
+
+
+def write_native_archive(tmp_path, *machines):
+    archive = tmp_path / 'native-bundle.zip'
+    with zipfile.ZipFile(archive, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('handler.py', 'def handler(event, context):\n    return event\n')
+        zf.writestr('not_elf.so', b'plain text')
+        for i, machine in enumerate(machines):
+            zf.writestr(f'pkg/_native{i}.cpython-312-linux-gnu.so', elf_header(machine))
+    return str(archive)
+
+
+def test_detect_architecture(tmp_path):
+    assert_that(detect_architecture(write_mock_archive(tmp_path))).is_none()
+    assert_that(detect_architecture(write_native_archive(tmp_path, 183))).is_equal_to('arm64')
+    assert_that(detect_architecture(write_native_archive(tmp_path, 62))).is_equal_to('x86_64')
+
+
+def test_detect_mixed_architectures(tmp_path):
+    archive = write_native_archive(tmp_path, 183, 62)
+
+    assert_that(detect_architecture).raises(ValueError).when_called_with(archive)
+
+
+def test_deploy_uses_detected_architecture(lambda_client, execution_role, tmp_path):
+    deploy_mock_archive(execution_role, write_native_archive(tmp_path, 183))
+
+    config = lambda_client.get_function_configuration(FunctionName=LAMBDA_NAME)
+    assert_that(config['Architectures']).is_equal_to(['arm64'])
+
+
+def test_deploy_refuses_mismatched_architecture(lambda_client, execution_role, tmp_path):
+    archive = write_native_archive(tmp_path, 183)
+
+    with pytest.raises(ValueError):
+        deploy_mock_archive(execution_role, archive, architecture='x86_64')
+
+    assert_that(lambda_client.list_functions()['Functions']).is_empty()
+
+
+def test_deploy_publishes_changed_layers_only(lambda_client, execution_role, tmp_path):
+    archive = write_mock_archive(tmp_path)
+    layer = write_native_archive(tmp_path, 183)
+    deploy_mock_archive(execution_role, archive, layer_archive=layer)
+    deploy_mock_archive(execution_role, archive, layer_archive=layer)
+
+    versions = lambda_client.list_layer_versions(LayerName='mock_layer')['LayerVersions']
+    assert_that(versions).is_length(1)
+    config = lambda_client.get_function_configuration(FunctionName=LAMBDA_NAME)
+    assert_that([layer['Arn'] for layer in config['Layers']]).is_equal_to(
+        [versions[0]['LayerVersionArn']]
+    )
+    assert_that(config['Architectures']).is_equal_to(['arm64'])
+
+    with zipfile.ZipFile(layer, 'a') as zf:
+        zf.writestr('python/extra.py', '')
+    deploy_mock_archive(execution_role, archive, layer_archive=layer)
+
+    versions = lambda_client.list_layer_versions(LayerName='mock_layer')['LayerVersions']
+    assert_that(versions).is_length(2)
+    config = lambda_client.get_function_configuration(FunctionName=LAMBDA_NAME)
+    assert_that(config['Layers'][0]['Arn']).ends_with(':2')
+
+
+def test_deploy_keeps_unrelated_layers(lambda_client, execution_role, tmp_path):
+    archive = write_mock_archive(tmp_path)
+    layer = write_native_archive(tmp_path, 183)
+    deploy_mock_archive(execution_role, archive, layer_archive=layer)
+    extension = lambda_client.publish_layer_version(
+        LayerName='monitoring_extension', Content={'ZipFile': mock_zip('')}
+    )['LayerVersionArn']
+    mock_layer = lambda_client.get_function_configuration(FunctionName=LAMBDA_NAME)['Layers']
+    lambda_client.update_function_configuration(
+        FunctionName=LAMBDA_NAME, Layers=[extension, mock_layer[0]['Arn']]
+    )
+
+    with zipfile.ZipFile(layer, 'a') as zf:
+        zf.writestr('python/extra.py', '')
+    deploy_mock_archive(execution_role, archive, layer_archive=layer)
+
+    versions = lambda_client.list_layer_versions(LayerName='mock_layer')['LayerVersions']
+    config = lambda_client.get_function_configuration(FunctionName=LAMBDA_NAME)
+    assert_that([layer['Arn'] for layer in config['Layers']]).is_equal_to(
+        [extension, versions[0]['LayerVersionArn']]
+    )
+    assert_that(versions[0]['LayerVersionArn']).ends_with(':2')
@@ -1,9 +1,22 @@
+import subprocess
+import sys
 import pytest
 from unittest.mock import patch, MagicMock
 from lgw import parse_args
 from lgw.main import app
 
 
+def mock_config(**settings):
+    '''
+    Returns a config over `settings` and the defaults, parsed by everett as `load_config`
+    does.
+    '''
+    from everett.manager import ConfigManager, ConfigDictEnv
+    from lgw.settings import defaults
+
+    return ConfigManager([ConfigDictEnv(settings), ConfigDictEnv(defaults())])
+
+
 def test_gw_deploy():
     with patch("sys.argv", ["lgw", "gw-deploy", "--verbose", "--config-file=config.env"]):
         args = parse_args()
@@ -12,6 +25,13 @@ def test_gw_deploy():
         assert args['config_file'] == "config.env"
 
 
+def test_gw_deploy_plan():
+    with patch("sys.argv", ["lgw", "gw-deploy", "--plan"]):
+        args = parse_args()
+        assert args['command'] == "gw-deploy"
+        assert args['plan'] is True
+
+
 def test_gw_undeploy():
     with patch("sys.argv", ["lgw", "gw-undeploy", "--verbose", "--config-file=config.env"]):
         args = parse_args()
@@ -66,6 +86,37 @@ def test_lambda_invoke_with_payload():
         assert args['config_file'] == "config.env"
 
 
+def test_lambda_invoke_batch():
+    with patch(
+        "sys.argv",
+        [
+            "lgw",
+            "lambda-invoke",
+            "--lambda-name=myLambda",
+            "--batch=payloads.jsonl",
+            "--concurrency=32",
+            "--output=results.json",
+        ],
+    ):
+        args = parse_args()
+        assert args['command'] == "lambda-invoke"
+        assert args['batch'] == "payloads.jsonl"
+        assert args['concurrency'] == 32
+        assert args['repeat'] == 1
+        assert args['output'] == "results.json"
+        assert args['invocation_type'] == "RequestResponse"
+
+
+def test_lambda_invoke_event_stream():
+    with patch(
+        "sys.argv",
+        ["lgw", "lambda-invoke", "--lambda-name=myLambda", "--invocation-type=Event", "--stream"],
+    ):
+        args = parse_args()
+        assert args['invocation_type'] == "Event"
+        assert args['stream'] is True
+
+
 def test_lambda_delete():
     with patch(
         "sys.argv",
@@ -84,6 +135,88 @@ def test_lambda_archive():
         assert args['command'] == "lambda-archive"
         assert args['verbose'] is True
         assert args['config_file'] == "config.env"
+        assert args['watch'] is False
+
+
+def test_lambda_archive_watch():
+    with patch("sys.argv", ["lgw", "lambda-archive", "--watch", "--deploy", "--analyze"]):
+        args = parse_args()
+        assert args['watch'] is True
+        assert args['deploy'] is True
+        assert args['analyze'] is True
+
+
+def test_lambda_archive_builds_each_architecture(tmp_path):
+    from lgw.main import handle_lambda_archive
+
+    config = mock_config(
+        aws_lambda_archive_context_dir=str(tmp_path),
+        aws_lambda_archive_bundle_dir=str(tmp_path / 'build'),
+        aws_lambda_archive_builder='native',
+        aws_lambda_archive_architectures='arm64,x86_64',
+    )
+
+    def build(context_dir, archive_dir, name, *args):
+        return f'{archive_dir}/{name}'
+
+    with patch("lgw.native_bundle.build_native_lambda_archive", side_effect=build) as native:
+        handle_lambda_archive(config)
+
+    built = sorted(call.args[2:3] + call.args[11:13] for call in native.call_args_list)
+    assert built == [
+        ('lambda-bundle-arm64.zip', 'arm64', False),
+        ('lambda-bundle-x86_64.zip', 'x86_64', False),
+    ]
+
+
+@pytest.mark.parametrize("invocation_type", ["Event", "DryRun"])
+def test_lambda_invoke_stream_rejects_invocation_type(invocation_type):
+    from lgw.main import handle_invoke_lambda
+
+    with patch("lgw.lambda_util.invoke_function_stream") as invoke:
+        with pytest.raises(ValueError):
+            handle_invoke_lambda('myLambda', None, invocation_type, stream=True)
+    invoke.assert_not_called()
+
+
+def test_lambda_archive_builds_single_architecture_on_calling_thread(tmp_path):
+    import threading
+    from lgw.main import handle_lambda_archive
+
+    config = mock_config(
+        aws_lambda_archive_context_dir=str(tmp_path),
+        aws_lambda_archive_bundle_dir=str(tmp_path / 'build'),
+        aws_lambda_archive_builder='native',
+    )
+
+    threads = []
+
+    def build(context_dir, archive_dir, name, *args):
+        threads.append(threading.current_thread())
+        return f'{archive_dir}/{name}'
+
+    with patch("lgw.native_bundle.build_native_lambda_archive", side_effect=build):
+        handle_lambda_archive(config)
+
+    assert threads == [threading.current_thread()]
+
+
+@pytest.mark.parametrize(
+    "deploy_mode, deploy_function",
+    [("incremental", "create_rest_api"), ("openapi", "import_rest_api")],
+)
+def test_gw_deploy_mode(deploy_mode, deploy_function):
+    from lgw.main import handle_deploy_api_gateway
+
+    config = mock_config(
+        aws_api_name='api', aws_lambda_name='lambda', aws_api_deploy_mode=deploy_mode
+    )
+
+    with patch(f"lgw.api_gateway.{deploy_function}", return_value='https://api') as deploy:
+        handle_deploy_api_gateway(config)
+
+    deploy.assert_called_once()
+    assert deploy.call_args.args[-1] == {'application/json': 'Empty'}
 
 
 @pytest.mark.parametrize(
@@ -121,6 +254,20 @@ def test_command_routing(test_args, handler_function, config_args):
             "lgw.main.handle_deploy_lambda",
             [MagicMock(), "/path/to/lambda.zip"],
         ),
+        (
+            {
+                "command": "lambda-deploy",
+                "lambda_file": "/path/to/lambda.zip",
+                "layer_file": "/path/to/layer.zip",
+            },
+            "lgw.main.handle_deploy_lambda",
+            [MagicMock(), "/path/to/lambda.zip", "/path/to/layer.zip"],
+        ),
+        (
+            {"command": "lambda-archive", "watch": True, "deploy": False},
+            "lgw.main.handle_lambda_archive",
+            [MagicMock(), True, False, False],
+        ),
     ],
 )
 def test_command_routing_with_config_plus_params(test_args, handler_function, config_args):
@@ -140,7 +287,30 @@ def test_command_routing_with_config_plus_params(test_args, handler_function, co
         (
             {"command": "lambda-invoke", "lambda_name": "myLambda", "payload": "data.json"},
             "lgw.main.handle_invoke_lambda",
-            ("myLambda", "data.json"),
+            ("myLambda", "data.json", "RequestResponse", False, None),
+        ),
+        (
+            {
+                "command": "lambda-invoke",
+                "lambda_name": "myLambda",
+                "invocation_type": "Event",
+                "stream": True,
+                "output": "response.bin",
+            },
+            "lgw.main.handle_invoke_lambda",
+            ("myLambda", None, "Event", True, "response.bin"),
+        ),
+        (
+            {
+                "command": "lambda-invoke",
+                "lambda_name": "myLambda",
+                "batch": "payloads.jsonl",
+                "concurrency": 32,
+                "repeat": 2,
+                "output": None,
+            },
+            "lgw.main.handle_invoke_lambda_batch",
+            ("myLambda", "payloads.jsonl", 32, 2, None, "RequestResponse"),
         ),
         (
             {"command": "lambda-delete", "lambda_name": "myLambda"},
@@ -156,3 +326,9 @@ def test_command_routing_without_config(test_args, handler_function, expected_ar
 
         # Check the correct handler was called
         patched_handler.assert_called_once_with(*expected_args)
+
+
+def test_main_imports_no_sdks():
+    script = 'import sys, lgw.main; print(sorted(set(sys.modules) & {"boto3", "docker", "tld"}))'
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True)
+    assert result.stdout.strip() == '[]'
@@ -0,0 +1,120 @@
+import os
+import sys
+import zipfile
+import subprocess
+
+import pytest
+from assertpy import assert_that
+from unittest.mock import patch
+
+from lgw.native_bundle import (
+    build_native_lambda_archive,
+    install_wheels,
+    platform_tags,
+    SdistRequired,
+    InterpreterMismatch,
+)
+
+
+def mock_install_wheels(requirements, target, *args):
+    for name in ['pkg/__init__.py', 'pkg/__pycache__/x.pyc', 'pkg-1.0.dist-info/RECORD', 'bin/x']:
+        os.makedirs(os.path.dirname(os.path.join(target, name)), exist_ok=True)
+        with open(os.path.join(target, name), 'w') as f:
+            f.write(name)
+
+
+def test_platform_tags():
+    assert_that(platform_tags('arm64')).contains('manylinux2014_aarch64')
+    assert_that(platform_tags('x86_64')).contains('manylinux_2_28_x86_64')
+
+
+def test_build_native_lambda_archive(tmp_path):
+    context = tmp_path / 'context'
+    (context / 'app').mkdir(parents=True)
+    (context / 'requirements.txt').write_text('pkg\n')
+    (context / 'handler.py').write_text('')
+    (context / 'app' / 'views.py').write_text('')
+    (context / 'app' / '__pycache__').mkdir()
+    (context / 'app' / '__pycache__' / 'views.cpython-312.pyc').write_text('')
+    (context / 'app' / '.DS_Store').write_text('')
+    (context / 'app' / 'db.sqlite3').write_text('')
+    (context / 'app' / 'local_settings.py').write_text('')
+    (context / 'secrets.json').write_text('')
+    (context / '.dockerignore').write_text('app/local_settings.py\nsecrets.json\n')
+    addl_files = [('handler.py', './'), ('app', 'app/'), ('secrets.json', './')]
+
+    with patch('lgw.native_bundle.install_wheels', side_effect=mock_install_wheels):
+        archive = build_native_lambda_archive(str(context), str(tmp_path), 'bundle.zip', addl_files)
+
+    with zipfile.ZipFile(archive) as zf:
+        assert_that(zf.namelist()).is_equal_to(
+            ['app/views.py', 'handler.py', 'pkg/__init__.py', 'requirements.txt']
+        )
+
+
+def test_build_native_lambda_archive_with_layer(tmp_path):
+    context = tmp_path / 'context'
+    context.mkdir()
+    (context / 'requirements.txt').write_text('pkg\n')
+    (context / 'handler.py').write_text('')
+
+    with patch('lgw.native_bundle.install_wheels', side_effect=mock_install_wheels):
+        archive = build_native_lambda_archive(
+            str(context), str(tmp_path), 'bundle.zip', [('handler.py', './')], layer=True
+        )
+
+    with zipfile.ZipFile(archive) as zf:
+        assert_that(zf.namelist()).is_equal_to(['handler.py', 'requirements.txt'])
+    with zipfile.ZipFile(tmp_path / 'bundle-layer.zip') as zf:
+        assert_that(zf.namelist()).is_equal_to(['python/pkg/__init__.py'])
+
+
+def test_build_native_lambda_archive_with_bytecode(tmp_path):
+    context = tmp_path / 'context'
+    context.mkdir()
+    (context / 'requirements.txt').write_text('pkg\n')
+    (context / 'handler.py').write_text('')
+    running_version = '%d.%d' % sys.version_info[:2]
+
+    with patch('lgw.native_bundle.install_wheels', side_effect=mock_install_wheels):
+        with pytest.raises(InterpreterMismatch):
+            build_native_lambda_archive(
+                str(context), str(tmp_path), 'bundle.zip', bytecode='pyc', python_version='2.7'
+            )
+        archive = build_native_lambda_archive(
+            str(context),
+            str(tmp_path),
+            'bundle.zip',
+            [('handler.py', './')],
+            bytecode='pyc-only',
+            excludes=['*/bin', '*dist-info*'],
+            python_version=running_version,
+        )
+
+    with zipfile.ZipFile(archive) as zf:
+        names = zf.namelist()
+    assert_that(names).contains('handler.py', 'pkg/__init__.pyc', 'requirements.txt')
+    assert_that(names).does_not_contain('pkg/__init__.py')
+    assert_that([n for n in names if n.startswith('__pycache__/handler.')]).is_length(1)
+
+
+def test_install_wheels_requiring_sdist(tmp_path):
+    failed = subprocess.CompletedProcess(
+        [], 1, '', 'ERROR: No matching distribution found for pycrypto==2.6.1'
+    )
+
+    with patch('lgw.native_bundle.subprocess.run', return_value=failed):
+        with pytest.raises(SdistRequired):
+            install_wheels('requirements.txt', str(tmp_path))
+
+
+def test_install_wheels_offline_from_wheelhouse(tmp_path):
+    succeeded = subprocess.CompletedProcess([], 0, '', '')
+
+    with patch('lgw.native_bundle.subprocess.run', return_value=succeeded) as run:
+        install_wheels('requirements.txt', str(tmp_path / 'site'), 'cache', 'wheels')
+
+    command = run.call_args.args[0]
+    assert_that(command).contains('--no-index')
+    assert_that(command[command.index('--cache-dir') + 1]).is_equal_to(os.path.abspath('cache'))
+    assert_that(command[command.index('--find-links') + 1]).is_equal_to(os.path.abspath('wheels'))
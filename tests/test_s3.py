@@ -0,0 +1,86 @@
+import os
+import boto3
+
+import pytest
+from moto import mock_aws
+from assertpy import assert_that
+from unittest.mock import patch
+
+from lgw.clients import reset_clients
+from lgw.util import configure_logging, file_sha256
+from lgw.s3 import upload_file
+
+configure_logging()
+
+DEFAULT_REGION = 'us-east-1'
+BUCKET = 'mock-archive-bucket'
+KEY = 'lambda/lambda-bundle.zip'
+
+
+@pytest.fixture(scope='function')
+def aws_credentials():
+    '''
+    Mocked AWS Credentials for moto.
+    '''
+    os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
+    os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
+    os.environ['AWS_SECURITY_TOKEN'] = 'testing'
+    os.environ['AWS_SESSION_TOKEN'] = 'testing'
+    os.environ["AWS_DEFAULT_REGION"] = 'us-east-1'
+    reset_clients()
+
+
+@pytest.fixture(scope='function')
+def s3_client(aws_credentials):
+    with mock_aws():
+        client = boto3.client('s3', region_name=DEFAULT_REGION)
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+@pytest.fixture(scope='function')
+def archive(tmp_path):
+    archive = tmp_path / 'lambda-bundle.zip'
+    archive.write_bytes(os.urandom(1024))
+    return str(archive)
+
+
+def test_upload_file(s3_client, archive):
+    key = upload_file(BUCKET, KEY, archive)
+
+    assert_that(key).is_equal_to(KEY)
+    response = s3_client.head_object(Bucket=BUCKET, Key=KEY)
+    assert_that(response['Metadata']).contains_entry({'sha256': file_sha256(archive).hexdigest()})
+
+
+def test_upload_file_content_addressed(s3_client, archive):
+    key = upload_file(BUCKET, 'lambda/', archive, content_addressed=True)
+
+    assert_that(key).is_equal_to('lambda/%s.zip' % file_sha256(archive).hexdigest())
+    s3_client.head_object(Bucket=BUCKET, Key=key)
+
+
+def test_upload_file_content_addressed_without_prefix(s3_client, archive):
+    key = upload_file(BUCKET, '', archive, content_addressed=True)
+
+    assert_that(key).is_equal_to('%s.zip' % file_sha256(archive).hexdigest())
+    s3_client.head_object(Bucket=BUCKET, Key=key)
+
+
+def test_upload_file_skips_existing_object(s3_client, archive):
+    upload_file(BUCKET, KEY, archive)
+
+    with patch('lgw.s3.S3Transfer') as patched_transfer:
+        upload_file(BUCKET, KEY, archive)
+        patched_transfer.assert_not_called()
+
+
+def test_upload_file_replaces_changed_object(s3_client, archive):
+    upload_file(BUCKET, KEY, archive)
+
+    with open(archive, 'ab') as f:
+        f.write(b'changed')
+    upload_file(BUCKET, KEY, archive, multipart_chunksize=5 * 1024 * 1024, max_concurrency=2)
+
+    response = s3_client.head_object(Bucket=BUCKET, Key=KEY)
+    assert_that(response['Metadata']).contains_entry({'sha256': file_sha256(archive).hexdigest()})
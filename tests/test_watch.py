@@ -0,0 +1,50 @@
+import os
+import zipfile
+
+from assertpy import assert_that
+
+from lgw.archiver import write_archive
+from lgw.native_bundle import project_entries
+from lgw.watch import snapshot, update_from_snapshots
+
+
+def test_update_from_snapshots(tmp_path):
+    (tmp_path / 'app').mkdir()
+    (tmp_path / 'requirements.txt').write_text('')
+    (tmp_path / 'handler.py').write_text('v1')
+    (tmp_path / 'app' / 'views.py').write_text('')
+    addl_files = [('handler.py', './'), ('app', 'app/')]
+    location = str(tmp_path / 'bundle.zip')
+    write_archive(location, project_entries(str(tmp_path), addl_files))
+    previous = snapshot(str(tmp_path), addl_files)
+
+    assert_that(update_from_snapshots(location, previous, previous)).is_false()
+
+    (tmp_path / 'handler.py').write_text('v2')
+    os.utime(tmp_path / 'handler.py', ns=(0, 0))
+    os.remove(tmp_path / 'app' / 'views.py')
+    current = snapshot(str(tmp_path), addl_files)
+
+    assert_that(update_from_snapshots(location, previous, current)).is_true()
+    with zipfile.ZipFile(location) as zf:
+        assert_that(zf.namelist()).is_equal_to(['handler.py', 'requirements.txt'])
+        assert_that(zf.read('handler.py')).is_equal_to(b'v2')
+
+
+def test_snapshot_skips_dockerignored_files(tmp_path):
+    (tmp_path / 'app').mkdir()
+    (tmp_path / 'requirements.txt').write_text('')
+    (tmp_path / 'app' / 'views.py').write_text('')
+    addl_files = [('app', 'app/')]
+    location = str(tmp_path / 'bundle.zip')
+    write_archive(location, project_entries(str(tmp_path), addl_files))
+    previous = snapshot(str(tmp_path), addl_files)
+
+    (tmp_path / 'app' / 'db.sqlite3').write_text('')
+    (tmp_path / 'app' / '.DS_Store').write_text('')
+    (tmp_path / 'app' / '__pycache__').mkdir()
+    (tmp_path / 'app' / '__pycache__' / 'views.cpython-312.pyc').write_text('')
+    current = snapshot(str(tmp_path), addl_files)
+
+    assert_that(current).contains_only('app/views.py', 'requirements.txt')
+    assert_that(update_from_snapshots(location, previous, current)).is_false()